@@ -0,0 +1,250 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import Manager
+
+import plotly.graph_objs as go
+import plotly.io as pio
+
+from minecraft_events import event_record
+
+# Shared between the web process and pool workers so workers can report progress
+_progress = None
+
+
+def _init_worker(progress):
+    global _progress
+    _progress = progress
+
+
+def build_analysis(file_path, filename, job_id=None):
+    """Build the analysis page data for a session, including the 3D path plot.
+
+    Runs in a pool worker; progress is reported through the shared dict.
+    """
+    def report_progress(fraction):
+        if _progress is not None and job_id is not None:
+            _progress[job_id] = fraction
+
+    with open(file_path, 'r') as f:
+        data = json.load(f)
+    report_progress(0.3)
+
+    # Build player paths and block events
+    player_paths = {}
+    block_events = []  # List of dicts: {'type': 'placed'/'broken', 'player': ..., 'pos': (x, y, z)}
+    for event in data.get('events', []):
+        # The capture server stores this record; older files get it computed here
+        record = event_record(event)
+        player = record.get('player')
+        if not player or 'x' not in record:
+            continue
+
+        pos = (record['x'], record['y'], record['z'])
+        player_paths.setdefault(player, []).append(pos)
+
+        event_name = event.get('event') or event.get('type') or ""
+        if event_name == "BlockPlaced":
+            block_events.append({'type': 'placed', 'player': player, 'pos': pos})
+        elif event_name == "BlockBroken":
+            block_events.append({'type': 'broken', 'player': player, 'pos': pos})
+
+    report_progress(0.6)
+
+    # Create Plotly traces
+    traces = []
+    colors = [
+        'red', 'blue', 'green', 'orange', 'purple', 'cyan', 'magenta', 'yellow', 'brown', 'black'
+    ]
+    for idx, (player, points) in enumerate(player_paths.items()):
+        if not points:
+            continue
+        xs, ys, zs = zip(*points)
+        traces.append(go.Scatter3d(
+            x=xs, y=ys, z=zs,
+            mode='lines+markers',
+            name=player,
+            line=dict(color=colors[idx % len(colors)], width=4),
+            marker=dict(size=3),
+        ))
+
+    # BlockPlaced markers
+    placed_x, placed_y, placed_z, placed_players = [], [], [], []
+    broken_x, broken_y, broken_z, broken_players = [], [], [], []
+    for ev in block_events:
+        x, y, z = ev['pos']
+        if ev['type'] == 'placed':
+            placed_x.append(x)
+            placed_y.append(y)
+            placed_z.append(z)
+            placed_players.append(ev['player'])
+        elif ev['type'] == 'broken':
+            broken_x.append(x)
+            broken_y.append(y)
+            broken_z.append(z)
+            broken_players.append(ev['player'])
+    if placed_x:
+        traces.append(go.Scatter3d(
+            x=placed_x, y=placed_y, z=placed_z,
+            mode='markers',
+            name='Block Placed',
+            marker=dict(symbol='diamond', color='red', size=6),
+            text=placed_players,
+            hovertemplate='Block Placed by %{text}<br>(%{x}, %{y}, %{z})'
+        ))
+    if broken_x:
+        traces.append(go.Scatter3d(
+            x=broken_x, y=broken_y, z=broken_z,
+            mode='markers',
+            name='Block Broken',
+            marker=dict(symbol='x', color='blue', size=6),
+            text=broken_players,
+            hovertemplate='Block Broken by %{text}<br>(%{x}, %{y}, %{z})'
+        ))
+
+    layout = go.Layout(
+        title='3D Player Path Trace (with Block Placements/Breaks)',
+        scene=dict(
+            xaxis_title='X', yaxis_title='Y', zaxis_title='Z'
+        ),
+        width=900, height=650,
+        showlegend=True,
+        margin=dict(l=0, r=0, b=0, t=40)
+    )
+
+    report_progress(0.8)
+    fig = go.Figure(data=traces, layout=layout)
+    plot_html = pio.to_html(fig, full_html=False)
+
+    analysis = {
+        'filename': filename,
+        'server_start_time': data.get('server_start'),
+        'total_events': len(data.get('events', [])),
+        'total_players': len(data.get('players', {})),
+        'players': list(data.get('players', {}).keys()),
+        'stats': data.get('stats', {}),
+        'plot_html': plot_html,
+    }
+    report_progress(1.0)
+    return analysis
+
+
+class AnalysisJobs:
+    """Runs session analyses on a process pool and caches the results.
+
+    Jobs are keyed by file and its size/mtime, so concurrent requests for the
+    same unchanged file share one job and a finished result is reused until
+    the file changes.
+    """
+
+    def __init__(self, max_workers=2, max_results=8):
+        self.max_workers = max_workers
+        self.max_results = max_results
+        self._pool = None
+        self._manager = None
+        self._progress = None
+        self._jobs = {}
+        self._by_key = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _ensure_pool(self):
+        if self._manager is None:
+            self._manager = Manager()
+            self._progress = self._manager.dict()
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self._progress,)
+            )
+
+    def submit(self, file_path, filename):
+        """Start analysing a file, or return the existing job for it."""
+        stat = os.stat(file_path)
+        key = (file_path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            job_id = self._by_key.get(key)
+            if job_id is not None:
+                job = self._jobs[job_id]
+                if job['status'] != 'failed':
+                    self._by_key.move_to_end(key)
+                    return job
+
+            self._ensure_pool()
+            job_id = uuid.uuid4().hex
+            job = {
+                'id': job_id,
+                'filename': filename,
+                'status': 'queued',
+                'submitted': time.time(),
+                'error': None,
+                'result': None
+            }
+            self._progress[job_id] = 0.0
+            try:
+                future = self._submit(file_path, filename, job_id)
+            except Exception:
+                self._progress.pop(job_id, None)
+                raise
+            # Only registered once it is really queued, so a failed submit leaves no stuck job
+            self._jobs[job_id] = job
+            self._by_key[key] = job_id
+            job['future'] = future
+            self._evict()
+        # Outside the lock: a future that is already done runs _finish right here
+        future.add_done_callback(lambda f, job=job: self._finish(job, f))
+        return job
+
+    def _submit(self, file_path, filename, job_id):
+        try:
+            return self._pool.submit(build_analysis, file_path, filename, job_id)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); the pool cannot be reused
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._ensure_pool()
+            return self._pool.submit(build_analysis, file_path, filename, job_id)
+
+    def _finish(self, job, future):
+        with self._lock:
+            try:
+                job['result'] = future.result()
+                job['status'] = 'done'
+            except Exception as e:
+                job['error'] = str(e)
+                job['status'] = 'failed'
+            job.pop('future', None)
+
+    def _evict(self):
+        """Forget the oldest finished jobs beyond max_results."""
+        while len(self._by_key) > self.max_results:
+            key, job_id = next(iter(self._by_key.items()))
+            if self._jobs[job_id]['status'] in ('queued', 'running'):
+                break
+            del self._by_key[key]
+            del self._jobs[job_id]
+            self._progress.pop(job_id, None)
+
+    def get(self, job_id):
+        """Get a job by id, or None."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def describe(self, job):
+        """Job status without the result, for the JSON API."""
+        status = job['status']
+        progress = 1.0 if status == 'done' else self._progress.get(job['id'], 0.0)
+        if status == 'queued' and progress > 0:
+            status = 'running'
+        return {
+            'id': job['id'],
+            'filename': job['filename'],
+            'status': status,
+            'progress': progress,
+            'error': job['error']
+        }
@@ -2,8 +2,13 @@ import os
 import subprocess
 import threading
 import json
-from flask import Flask, render_template, jsonify, send_file, send_from_directory, request
-from datetime import datetime
+import gzip
+import zlib
+import argparse
+import itertools
+from multiprocessing import parent_process
+from flask import Flask, render_template, jsonify, send_file, send_from_directory, request, Response, stream_with_context, make_response
+from datetime import datetime, date
 import signal
 import sys
 import time
@@ -12,21 +17,372 @@ import socket
 import psutil
 import shutil
 import requests
-import plotly.graph_objs as go
-import plotly.io as pio
+from werkzeug.security import safe_join
+import session_export
+import event_index
+import archive_analytics
+import heatmap
+import analysis_jobs
+
+# zstd downloads are offered only when the zstandard package is installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 app = Flask(__name__)
 
+# Responses smaller than this aren't worth compressing
+COMPRESS_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+STATIC_MAX_AGE = 7 * 24 * 3600
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# Number of console lines kept for the dashboard and /api/output
+OUTPUT_HISTORY_LINES = int(os.environ.get('OUTPUT_HISTORY_LINES', 1000))
+
+# Each open status stream holds a server thread, so they are capped below the
+# thread count; refused dashboards fall back to polling. Production mode keeps
+# STREAM_SPARE_THREADS of its --threads free for everything else.
+MAX_STATUS_STREAMS = int(os.environ.get('MAX_STATUS_STREAMS', 24))
+STREAM_SPARE_THREADS = 8
+STREAM_RETRY_AFTER = 60
+status_stream_slots = threading.BoundedSemaphore(MAX_STATUS_STREAMS)
+
+# Lines the capture server prints once it is listening or has failed to start
+READY_PREFIX = "[READY] Listening on "
+FAILED_PREFIX = "[FAILED] "
+
+# Set EXTERNAL_IP to skip discovery entirely (e.g. behind a known NAT)
+EXTERNAL_IP_OVERRIDE = os.environ.get('EXTERNAL_IP')
+EXTERNAL_IP_CACHE_TTL = int(os.environ.get('EXTERNAL_IP_CACHE_TTL', 6 * 3600))
+
+class OutputBuffer:
+    """Fixed-capacity ring buffer of console lines with sequence numbers
+    
+    Every line gets a monotonically increasing sequence number so clients can
+    ask for just the lines they have not seen yet. Old lines are overwritten
+    in place once the buffer is full.
+    """
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self._lines = [None] * self.capacity
+        self._first_seq = 0  # oldest sequence number still valid after clear()
+        self.next_seq = 0
+        self._lock = threading.Lock()
+    
+    def append(self, line):
+        """Store a line and return its sequence number"""
+        with self._lock:
+            seq = self.next_seq
+            self._lines[seq % self.capacity] = line
+            self.next_seq = seq + 1
+            return seq
+    
+    def clear(self):
+        """Drop all lines without resetting the sequence numbers"""
+        with self._lock:
+            self._first_seq = self.next_seq
+    
+    def since(self, seq=0, limit=None):
+        """Get lines with sequence numbers >= seq
+        
+        Returns (first_seq, lines, next_seq). first_seq is greater than seq
+        when older lines have already been overwritten.
+        """
+        with self._lock:
+            end = self.next_seq
+            first = max(seq, self._first_seq, end - self.capacity, 0)
+            if limit is not None:
+                first = max(first, end - limit)
+            lines = [self._lines[i % self.capacity] for i in range(first, end)]
+            return first, lines, end
+    
+    def tail(self, count):
+        """Get the last count lines"""
+        return self.since(self.next_seq - count)[1]
+
+# Bookkeeping files in the data folder that are not captured sessions
+INTERNAL_DATA_FILES = {"pending_commands.json", "active_session.json", "control_requests.json", "memory_report.json"}
+
+def is_data_file(filename):
+    """Check whether a file in the data folder is a captured data or log file"""
+    if filename.startswith('.') or filename in INTERNAL_DATA_FILES:
+        return False
+    return filename.endswith('.json') or filename.endswith('.log')
+
+class DataCatalogue:
+    """Maintained index of the data folder
+    
+    A background thread keeps size, mtime, type, event count and players for
+    every data file. The folder is only rescanned when its mtime changes (or
+    on a slow periodic sweep); the files of the running session are announced
+    by the capture server in active_session.json and are the only ones
+    re-stated on every refresh. Event counts and players of finished sessions
+    are parsed once and cached in .catalogue.json, as are the line counts
+    of log files so a restart resumes counting where it left off.
+    
+    version changes on every update; listing_version only when files are
+    added, removed or re-summarized, so an update of just the live files can
+    be sent to clients as the changed entries instead of a full listing.
+    """
+    SORT_KEYS = {
+        'modified': lambda e: e['mtime'],
+        'name': lambda e: e['name'],
+        'size': lambda e: e['size_bytes'],
+        'events': lambda e: e['event_count'] or 0,
+    }
+    
+    def __init__(self, data_folder, refresh_interval=2, sweep_interval=60, save_interval=30, on_change=None):
+        self.data_folder = data_folder
+        self.refresh_interval = refresh_interval
+        self.sweep_interval = sweep_interval
+        self.save_interval = save_interval
+        self.on_change = on_change
+        self.cache_file = os.path.join(data_folder, ".catalogue.json")
+        self.session_file = os.path.join(data_folder, "active_session.json")
+        self.entries = {}
+        self.version = 0
+        self.listing_version = 0
+        self._live_files = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._folder_mtime = None
+        self._session_mtime = None
+        self._session = {}
+        self._last_sweep = 0
+        self._last_save = 0
+        self._needs_summary = set()
+        self._cache_dirty = False
+        self._load_cache()
+    
+    def start(self):
+        """Start the background refresh thread"""
+        thread = threading.Thread(target=self._watch, daemon=True)
+        thread.start()
+    
+    def invalidate(self):
+        """Force a full rescan on the next refresh and run it now"""
+        self._folder_mtime = None
+        self._wakeup.set()
+    
+    def _watch(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing data catalogue: {e}")
+            self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
+    
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                for entry in json.load(f).get('files', []):
+                    self.entries[entry['name']] = entry
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+    
+    def _save_cache(self):
+        with self._lock:
+            files = list(self.entries.values())
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({'files': files}, f)
+        os.replace(tmp_file, self.cache_file)
+        self._cache_dirty = False
+    
+    def _make_entry(self, name, stat, previous=None):
+        entry = {
+            'name': name,
+            'size_bytes': stat.st_size,
+            'mtime': stat.st_mtime,
+            'type': 'log' if name.endswith('.log') else 'data',
+            'event_count': None,
+            'players': [],
+        }
+        if previous and previous['size_bytes'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+            entry['event_count'] = previous['event_count']
+            entry['players'] = previous['players']
+        elif entry['type'] == 'data':
+            self._needs_summary.add(name)
+        if previous and 'line_index' in previous:
+            # Still valid for a grown log; count_log_lines restarts if it shrank
+            entry['line_index'] = previous['line_index']
+        return entry
+    
+    def _read_session_hint(self):
+        """Reload active_session.json if the capture server updated it"""
+        try:
+            mtime = os.stat(self.session_file).st_mtime_ns
+        except OSError:
+            self._session = {}
+            return
+        if mtime == self._session_mtime:
+            return
+        try:
+            with open(self.session_file, 'r') as f:
+                self._session = json.load(f)
+            self._session_mtime = mtime
+        except (OSError, ValueError):
+            pass
+    
+    def refresh(self):
+        """Bring the catalogue up to date and return True if anything changed"""
+        changed = False
+        listing_changed = False
+        self._read_session_hint()
+        live_files = {self._session.get('data_file'), self._session.get('log_file')} - {None}
+        self._live_files = live_files
+        
+        folder_mtime = os.stat(self.data_folder).st_mtime_ns
+        now = time.monotonic()
+        if folder_mtime != self._folder_mtime or now - self._last_sweep >= self.sweep_interval:
+            listing_changed |= self._sweep()
+            self._folder_mtime = folder_mtime
+            self._last_sweep = now
+        else:
+            for name in live_files:
+                changed |= self._restat(name)
+        
+        # The capture server reports live totals, so the file is never parsed
+        data_file = self._session.get('data_file')
+        with self._lock:
+            entry = self.entries.get(data_file)
+            if entry is not None:
+                self._needs_summary.discard(data_file)
+                summary = (self._session.get('event_count'), self._session.get('players', []))
+                if (entry['event_count'], entry['players']) != summary:
+                    entry['event_count'], entry['players'] = summary
+                    changed = True
+        
+        listing_changed |= self._summarize_pending()
+        
+        if listing_changed:
+            self.listing_version += 1
+        if changed or listing_changed:
+            changed = True
+            self._cache_dirty = True
+            self.version += 1
+            if self.on_change:
+                self.on_change()
+        if self._cache_dirty and now - self._last_save >= self.save_interval:
+            try:
+                self._save_cache()
+                self._last_save = now
+                # Writing the cache touches the folder; don't treat that as a change
+                self._folder_mtime = os.stat(self.data_folder).st_mtime_ns
+            except OSError as e:
+                print(f"Error saving data catalogue: {e}")
+        return changed
+    
+    def _sweep(self):
+        """Rescan the folder, keeping cached summaries of unchanged files"""
+        seen = {}
+        with os.scandir(self.data_folder) as it:
+            for dir_entry in it:
+                if dir_entry.is_file() and is_data_file(dir_entry.name):
+                    seen[dir_entry.name] = dir_entry.stat()
+        
+        changed = False
+        with self._lock:
+            for name in list(self.entries):
+                if name not in seen:
+                    del self.entries[name]
+                    self._needs_summary.discard(name)
+                    changed = True
+            for name, stat in seen.items():
+                previous = self.entries.get(name)
+                if previous and previous['size_bytes'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+                    continue
+                self.entries[name] = self._make_entry(name, stat, previous)
+                changed = True
+        return changed
+    
+    def _restat(self, name):
+        try:
+            stat = os.stat(os.path.join(self.data_folder, name))
+        except OSError:
+            return False
+        with self._lock:
+            previous = self.entries.get(name)
+            if previous and previous['size_bytes'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+                return False
+            self.entries[name] = self._make_entry(name, stat, previous)
+        return True
+    
+    def _summarize_pending(self):
+        """Parse event counts and players for data files that need them"""
+        changed = False
+        for name in list(self._needs_summary):
+            self._needs_summary.discard(name)
+            try:
+                with open(os.path.join(self.data_folder, name), 'r') as f:
+                    data = json.load(f)
+                event_count = len(data.get('events', []))
+                players = list(data.get('players', {}).keys())
+            except (OSError, ValueError, AttributeError):
+                # Partially written or not a session file; retried when it changes
+                continue
+            with self._lock:
+                entry = self.entries.get(name)
+                if entry is not None:
+                    entry['event_count'] = event_count
+                    entry['players'] = players
+                    changed = True
+        return changed
+    
+    def line_index(self, name):
+        """(bytes counted, newlines seen) recorded for a log file"""
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is None or 'line_index' not in entry:
+                return 0, 0
+            return tuple(entry['line_index'])
+    
+    def set_line_index(self, name, counted, newlines):
+        """Record how far a log file has been counted; saved with the cache"""
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is not None and entry.get('line_index') != [counted, newlines]:
+                entry['line_index'] = [counted, newlines]
+                self._cache_dirty = True
+    
+    def session_summary(self):
+        """The capture server's active_session.json as of the last refresh"""
+        return self._session
+    
+    def live_entries(self):
+        """Current entries of the running session's files"""
+        with self._lock:
+            return [dict(self.entries[name]) for name in self._live_files if name in self.entries]
+    
+    def query(self, sort='modified', order='desc', file_type=None, page=1, per_page=None):
+        """Get a sorted page of catalogue entries and the total count"""
+        with self._lock:
+            entries = list(self.entries.values())
+        if file_type:
+            entries = [e for e in entries if e['type'] == file_type]
+        entries.sort(key=self.SORT_KEYS.get(sort, self.SORT_KEYS['modified']), reverse=(order != 'asc'))
+        total = len(entries)
+        if per_page:
+            start = (max(page, 1) - 1) * per_page
+            entries = entries[start:start + per_page]
+        return entries, total
+
 class ServerManager:
-    def __init__(self):
+    def __init__(self, output_history=OUTPUT_HISTORY_LINES):
         self.process = None
         self.is_running = False
         self.start_time = None
-        self.output_lines = []
-        self.max_output_lines = 100
+        self.output = OutputBuffer(output_history)
+        self.state_changed = threading.Condition()
+        self.ready = threading.Event()
+        self.ready_address = None
+        self.startup_timeout = 15
+        self._pending_cache = (None, 0)
         self.server_ip = self.get_server_ip()
-        self.external_ip = self.get_external_ip()
         
         self.server_script = "minecraft_data_capture_server_with_commands.py"
         
@@ -35,6 +391,12 @@ class ServerManager:
             os.makedirs(self.data_folder)
         
         self.command_file = os.path.join(self.data_folder, "pending_commands.json")
+        self.control_file = os.path.join(self.data_folder, "control_requests.json")
+        self.memory_report_file = os.path.join(self.data_folder, "memory_report.json")
+        self.external_ip_cache = os.path.join(self.data_folder, ".external_ip.json")
+        self.external_ip = EXTERNAL_IP_OVERRIDE or self._load_cached_external_ip()
+        self.catalogue = DataCatalogue(self.data_folder, on_change=self._notify_state_change)
+        self.analytics = archive_analytics.ArchiveAnalytics(self.data_folder)
         
         # Check script exists
         if not os.path.exists(self.server_script):
@@ -45,7 +407,8 @@ class ServerManager:
                     print(f"Using {self.server_script} instead")
                     break
         
-        self.cleanup_zombie_processes()
+        self.pid_file = os.path.join(self.data_folder, "capture_server.pid")
+        self.cleanup_stale_server()
         
         # Command presets
         self.command_presets = {
@@ -84,23 +447,63 @@ class ServerManager:
             "normal_day_cycle": "gamerule dodaylightcycle true"
         }
     
-    def cleanup_zombie_processes(self):
-        """Clean up any lingering Python processes"""
+    def cleanup_stale_server(self):
+        """Stop a capture server left running by an earlier run of this web interface
+        
+        Only the process recorded in this instance's PID file is touched, so
+        capture servers belonging to other instances on the same host are safe.
+        """
         try:
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if proc.info['name'] and 'python' in proc.info['name'].lower():
-                        cmdline = proc.info.get('cmdline', [])
-                        if cmdline and any('minecraft_data_capture_server' in arg for arg in cmdline):
-                            print(f"Found zombie process (PID: {proc.info['pid']}), terminating...")
-                            proc.terminate()
-                            time.sleep(1)
-                            if proc.is_running():
-                                proc.kill()
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
-        except Exception as e:
-            print(f"Error during cleanup: {e}")
+            with open(self.pid_file, 'r') as f:
+                info = json.load(f)
+            proc = psutil.Process(info['pid'])
+            # A different creation time means the PID was reused by another program
+            if abs(proc.create_time() - info['create_time']) > 1:
+                raise psutil.NoSuchProcess(info['pid'])
+        except (OSError, ValueError, KeyError, TypeError, psutil.NoSuchProcess, psutil.AccessDenied):
+            self._remove_pid_file()
+            return
+        
+        print(f"Found capture server from a previous run (PID: {proc.pid}), terminating...")
+        self._terminate_process_tree(proc)
+        self._remove_pid_file()
+    
+    def _write_pid_file(self):
+        proc = psutil.Process(self.process.pid)
+        with open(self.pid_file, 'w') as f:
+            json.dump({
+                'pid': proc.pid,
+                'create_time': proc.create_time(),
+                'script': self.server_script
+            }, f)
+    
+    def _remove_pid_file(self):
+        try:
+            os.remove(self.pid_file)
+        except OSError:
+            pass
+    
+    def _terminate_process_tree(self, proc, timeout=5):
+        """Terminate a process and its children, killing any that don't exit
+        
+        Returns True if the processes had to be killed.
+        """
+        try:
+            procs = proc.children(recursive=True) + [proc]
+        except psutil.NoSuchProcess:
+            return False
+        for p in procs:
+            try:
+                p.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        _, alive = psutil.wait_procs(procs, timeout=timeout)
+        for p in alive:
+            try:
+                p.kill()
+            except psutil.NoSuchProcess:
+                pass
+        return bool(alive)
     
     def get_server_ip(self):
         """Get the local IP address"""
@@ -113,8 +516,38 @@ class ServerManager:
         except Exception:
             return "localhost"
     
+    def _load_cached_external_ip(self):
+        """Get the external IP from the disk cache if it has not expired"""
+        try:
+            with open(self.external_ip_cache, 'r') as f:
+                cached = json.load(f)
+            if time.time() - cached['discovered_at'] < EXTERNAL_IP_CACHE_TTL:
+                return cached['ip']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+    
+    def start_external_ip_discovery(self):
+        """Look up the external IP in the background unless it is already known"""
+        if self.external_ip:
+            return
+        
+        def discover():
+            ip = self.get_external_ip()
+            if not ip:
+                return
+            self.external_ip = ip
+            try:
+                with open(self.external_ip_cache, 'w') as f:
+                    json.dump({'ip': ip, 'discovered_at': time.time()}, f)
+            except OSError as e:
+                print(f"Error caching external IP: {e}")
+            self._notify_state_change()
+        
+        threading.Thread(target=discover, daemon=True).start()
+    
     def get_external_ip(self):
-        """Get the external/public IP address"""
+        """Get the external/public IP address, or None if it can't be found"""
         try:
             # Try multiple services in case one is down
             services = [
@@ -136,13 +569,13 @@ class ServerManager:
                 except:
                     continue
             
-            # If all services fail, fall back to local IP
+            # If all services fail, the local IP is shown instead
             print("Could not determine external IP, using local IP")
-            return self.server_ip
+            return None
             
         except Exception as e:
             print(f"Error getting external IP: {e}")
-            return self.server_ip
+            return None
     
     def send_minecraft_command(self, command):
         """Add command to the pending commands file"""
@@ -166,10 +599,45 @@ class ServerManager:
             with open(self.command_file, 'w') as f:
                 json.dump(commands, f)
             
+            self._notify_state_change()
             return True, f"Command queued: {command}"
         except Exception as e:
             return False, f"Error sending command: {str(e)}"
     
+    def send_control_request(self, control):
+        """Add a diagnostics request for the capture server to the control file"""
+        if not self.is_running:
+            return False, "Server is not running"
+        
+        try:
+            requests_pending = []
+            if os.path.exists(self.control_file):
+                try:
+                    with open(self.control_file, 'r') as f:
+                        requests_pending = json.load(f)
+                except ValueError:
+                    requests_pending = []
+            
+            requests_pending.append(control)
+            with open(self.control_file, 'w') as f:
+                json.dump(requests_pending, f)
+            return True, f"Control request queued: {control['command']}"
+        except Exception as e:
+            return False, f"Error sending control request: {str(e)}"
+    
+    def read_session_summary(self):
+        """The capture server's active_session.json (subscriptions, leaderboards, live files)
+        
+        The catalogue reloads it whenever the capture server rewrites it.
+        """
+        return self.catalogue.session_summary()
+    
+    def get_leaderboards(self):
+        """Leaderboards published by the running capture server, or None"""
+        if not self.is_running:
+            return None
+        return self.read_session_summary().get('leaderboards')
+    
     def check_process_alive(self):
         """Check if the process is actually running"""
         if self.process:
@@ -177,6 +645,7 @@ class ServerManager:
             if poll is not None:
                 self.is_running = False
                 self.process = None
+                self._remove_pid_file()
                 return False
             return True
         return False
@@ -189,10 +658,15 @@ class ServerManager:
         self.is_running = False
         self.process = None
         
-        self.cleanup_zombie_processes()
+        self.cleanup_stale_server()
         
         try:
-            creationflags = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
+            # Run in its own process group so it can be stopped as a unit
+            # and doesn't receive Ctrl+C meant for the web interface
+            if sys.platform == "win32":
+                creationflags = subprocess.CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP
+            else:
+                creationflags = 0
             
             self.process = subprocess.Popen(
                 [sys.executable, '-u', self.server_script],
@@ -200,30 +674,54 @@ class ServerManager:
                 stderr=subprocess.STDOUT,
                 universal_newlines=True,
                 bufsize=1,
-                creationflags=creationflags
+                creationflags=creationflags,
+                start_new_session=(sys.platform != "win32")
             )
+            self._write_pid_file()
             
-            time.sleep(1)
-            
-            if self.process.poll() is not None:
-                output = ""
-                if self.process.stdout:
-                    output = self.process.stdout.read()
-                return False, f"Server failed to start. Output: {output}"
-            
-            self.is_running = True
-            self.start_time = datetime.now()
-            self.output_lines = ["Server starting..."]
+            # Fresh events per start, so the reader of a previous process
+            # can't set or clear them after a restart
+            ready = self.ready = threading.Event()
+            startup_done = threading.Event()
+            self.ready_address = None
+            self.output.clear()
+            self._append_output("Server starting...")
+            start_seq = self.output.next_seq
             
-            # Start output capture thread
-            output_thread = threading.Thread(target=self._capture_output)
+            # Start output capture thread; it also watches for the ready line
+            output_thread = threading.Thread(target=self._capture_output, args=(self.process, ready, startup_done))
             output_thread.daemon = True
             output_thread.start()
             
+            startup_done.wait(timeout=self.startup_timeout)
+            if not ready.is_set():
+                return False, self._abort_startup(start_seq)
+            
+            self.is_running = True
+            self.start_time = datetime.now()
+            self._notify_state_change()
             return True, "Server started successfully"
         except Exception as e:
             return False, f"Failed to start server: {str(e)}"
     
+    def _abort_startup(self, start_seq):
+        """Clean up after a failed start and describe why it failed"""
+        timed_out = self.process.poll() is None
+        if timed_out:
+            self._terminate_process_tree(psutil.Process(self.process.pid))
+        self.process.wait()
+        self.process = None
+        self._remove_pid_file()
+        
+        _, lines, _ = self.output.since(start_seq)
+        failures = [line[len(FAILED_PREFIX):] for line in lines if line.startswith(FAILED_PREFIX)]
+        if failures:
+            return f"Server failed to start: {failures[-1]}"
+        output = "\n".join(lines[-10:])
+        if timed_out:
+            return f"Server did not start listening within {self.startup_timeout} seconds. Output: {output}"
+        return f"Server failed to start. Output: {output}"
+    
     def stop_server(self):
         """Stop the Minecraft capture server"""
         if not self.check_process_alive():
@@ -232,99 +730,217 @@ class ServerManager:
             return True, "Server was not running"
         
         try:
-            if self.process:
-                self.process.terminate()
-                self.process.wait(timeout=5)
-                
+            killed = self._terminate_process_tree(psutil.Process(self.process.pid))
+            self.process.wait()
+            self._remove_pid_file()
+            
             self.is_running = False
             self.process = None
-            self.output_lines.append("Server stopped")
+            if killed:
+                self._notify_state_change()
+                return True, "Server force stopped"
+            self._append_output("Server stopped")
             return True, "Server stopped successfully"
-        except subprocess.TimeoutExpired:
-            if self.process:
-                self.process.kill()
-            self.is_running = False
-            self.process = None
-            return True, "Server force stopped"
         except Exception as e:
             self.is_running = False
             self.process = None
+            self._notify_state_change()
             return False, f"Error stopping server: {str(e)}"
     
-    def _capture_output(self):
-        """Capture output from the subprocess"""
-        if self.process and self.process.stdout:
-            try:
+    def _capture_output(self, process, ready, startup_done):
+        """Capture output from the subprocess
+        
+        ready and startup_done are the events of the start that launched
+        this process.
+        """
+        try:
+            if process.stdout:
                 while True:
-                    line = self.process.stdout.readline()
+                    line = process.stdout.readline()
                     if not line:
                         break
                     
                     line = line.strip()
                     if line:
-                        self.output_lines.append(line)
-                        if len(self.output_lines) > self.max_output_lines:
-                            self.output_lines.pop(0)
-                    
-                    if self.process.poll() is not None:
-                        self.is_running = False
-                        self.output_lines.append("Server process terminated")
-                        break
-            except Exception as e:
-                self.output_lines.append(f"Error reading output: {str(e)}")
+                        self._append_output(line)
+                        if line.startswith(READY_PREFIX) and not ready.is_set():
+                            host, _, port = line[len(READY_PREFIX):].rpartition(':')
+                            self.ready_address = (host, int(port))
+                            ready.set()
+                            startup_done.set()
+                
+                # Output ends when the process exits
+                process.wait()
+                ready.clear()
+                if self.process is process:
+                    self.is_running = False
+                self._append_output("Server process terminated")
+        except Exception as e:
+            self._append_output(f"Error reading output: {str(e)}")
+        finally:
+            startup_done.set()
     
-    def get_status(self):
-        """Get current server status"""
-        self.check_process_alive()
+    def get_health(self):
+        """Check that the capture server is alive and accepting connections"""
+        running = self.check_process_alive()
+        listening = False
+        address = None
+        if running and self.ready_address:
+            host, port = self.ready_address
+            address = f"{host}:{port}"
+            try:
+                socket.create_connection(self.ready_address, timeout=1).close()
+                listening = True
+            except OSError:
+                pass
+        return {
+            'web': 'ok',
+            'capture_server': {
+                'running': running,
+                'ready': running and self.ready.is_set(),
+                'listening': listening,
+                'address': address
+            }
+        }
+    
+    def _append_output(self, line):
+        """Add a line to the captured output and wake any status streams"""
+        self.output.append(line)
+        self._notify_state_change()
+    
+    def _notify_state_change(self):
+        """Wake status streams waiting for new output or status changes"""
+        with self.state_changed:
+            self.state_changed.notify_all()
+    
+    def get_commands_pending(self):
+        """Count queued commands, re-reading the file only when it changed"""
+        try:
+            stat = os.stat(self.command_file)
+        except OSError:
+            return 0
         
-        # Check if commands are being processed
-        commands_pending = 0
-        if os.path.exists(self.command_file):
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached_signature, count = self._pending_cache
+        if signature != cached_signature:
+            count = 0
             try:
                 with open(self.command_file, 'r') as f:
-                    commands = json.load(f)
-                    commands_pending = len(commands)
+                    count = len(json.load(f))
             except:
                 pass
-        
+            self._pending_cache = (signature, count)
+        return count
+    
+    def _connection_info(self):
+        """Get running state and the addresses clients should connect to"""
         # Use external IP if available, otherwise local
         display_ip = self.external_ip if self.external_ip else self.server_ip
-        
-        status = {
+        return {
             'is_running': self.is_running,
             'start_time': self.start_time.isoformat() if self.start_time else None,
-            'uptime': str(datetime.now() - self.start_time) if self.start_time and self.is_running else None,
-            'output': self.output_lines[-20:],
             'server_ip': display_ip,  # Use the external IP for display
             'local_ip': self.server_ip,  # Keep local IP for reference
             'external_ip': self.external_ip,  # Include external IP
+        }
+    
+    def get_status(self):
+        """Get current server status"""
+        self.check_process_alive()
+        
+        status = self._connection_info()
+        status.update({
+            'uptime': str(datetime.now() - self.start_time) if self.start_time and self.is_running else None,
+            'output': self.output.tail(20),
+            'output_seq': self.output.next_seq,
             'minecraft_port': 19131,
-            'commands_pending': commands_pending,
+            'commands_pending': self.get_commands_pending(),
             'command_presets': self.command_presets
-        }
+        })
         return status
     
-    def get_data_files(self):
-        """Get list of data files"""
-        files = []
-        try:
-            for file in os.listdir(self.data_folder):
-                if file.endswith('.json') or file.endswith('.log'):
-                    if file == "pending_commands.json":
-                        continue
-                    file_path = os.path.join(self.data_folder, file)
-                    stat = os.stat(file_path)
-                    files.append({
-                        'name': file,
-                        'size': self._format_size(stat.st_size),
-                        'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
-                        'size_bytes': stat.st_size,
-                        'type': 'log' if file.endswith('.log') else 'data'
-                    })
-            files.sort(key=lambda x: x['modified'], reverse=True)
-        except Exception as e:
-            print(f"Error listing files: {e}")
-        return files
+    def stream_status(self, keepalive_interval=15):
+        """Yield Server-Sent Events for status, output, queue, file and leaderboard changes
+        
+        The first event carries the full status including static data such as
+        the command presets; after that only changes are sent.
+        """
+        def sse(event, payload):
+            return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        
+        status = self.get_status()
+        next_seq = status['output_seq']
+        last_info = self._connection_info()
+        last_pending = status['commands_pending']
+        files_version = self.catalogue.version
+        listing_version = self.catalogue.listing_version
+        last_leaderboards = None
+        status['files_version'] = files_version
+        yield sse('init', status)
+        
+        last_sent = time.monotonic()
+        while True:
+            with self.state_changed:
+                self.state_changed.wait(timeout=1)
+            self.check_process_alive()
+            sent = False
+            
+            info = self._connection_info()
+            if info != last_info:
+                last_info = info
+                yield sse('status', info)
+                sent = True
+            
+            if self.output.next_seq != next_seq:
+                _, lines, next_seq = self.output.since(next_seq)
+                if lines:
+                    yield sse('output', {'lines': lines, 'next_seq': next_seq})
+                    sent = True
+            
+            pending = self.get_commands_pending()
+            if pending != last_pending:
+                last_pending = pending
+                yield sse('queue', {'commands_pending': pending})
+                sent = True
+            
+            if self.catalogue.version != files_version:
+                files_version = self.catalogue.version
+                payload = {'version': files_version}
+                if self.catalogue.listing_version == listing_version:
+                    # Only the live session files grew; clients patch those rows
+                    payload['entries'] = [self._format_entry(e) for e in self.catalogue.live_entries()]
+                listing_version = self.catalogue.listing_version
+                yield sse('files', payload)
+                sent = True
+            
+            leaderboards = self.get_leaderboards()
+            if leaderboards != last_leaderboards:
+                last_leaderboards = leaderboards
+                yield sse('leaderboards', leaderboards)
+                sent = True
+            
+            if sent:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= keepalive_interval:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+    
+    def get_data_files(self, **query):
+        """Get a page of data files from the catalogue and the total count"""
+        entries, total = self.catalogue.query(**query)
+        return [self._format_entry(entry) for entry in entries], total
+    
+    def _format_entry(self, entry):
+        return {
+            'name': entry['name'],
+            'size': self._format_size(entry['size_bytes']),
+            'modified': datetime.fromtimestamp(entry['mtime']).strftime('%Y-%m-%d %H:%M:%S'),
+            'size_bytes': entry['size_bytes'],
+            'type': entry['type'],
+            'event_count': entry['event_count'],
+            'players': entry['players']
+        }
     
     def clear_all_logs(self):
         """Clear all log and data files"""
@@ -336,21 +952,68 @@ class ServerManager:
             deleted_size = 0
             
             for file in os.listdir(self.data_folder):
-                if file.endswith('.json') or file.endswith('.log'):
-                    if file == "pending_commands.json":
-                        continue
+                if is_data_file(file):
                     file_path = os.path.join(self.data_folder, file)
                     file_size = os.path.getsize(file_path)
                     os.remove(file_path)
                     deleted_count += 1
                     deleted_size += file_size
             
-            self.output_lines = []
+            self.output.clear()
+            self.catalogue.invalidate()
             
             return True, f"Cleared {deleted_count} files ({self._format_size(deleted_size)})"
         except Exception as e:
             return False, f"Error clearing logs: {str(e)}"
     
+    def read_log_tail(self, file_path, num_lines=50, block_size=8192):
+        """Read the last lines of a log file by seeking backwards from the end"""
+        with open(file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            chunks = []
+            newlines = 0
+            # One extra newline is needed so the first kept line is complete
+            while pos > 0 and newlines <= num_lines:
+                read_size = min(block_size, pos)
+                pos -= read_size
+                f.seek(pos)
+                chunk = f.read(read_size)
+                chunks.append(chunk)
+                newlines += chunk.count(b'\n')
+        data = b''.join(reversed(chunks))
+        lines = data.splitlines(keepends=True)[-num_lines:]
+        return [line.decode('utf-8', errors='replace') for line in lines]
+    
+    def count_log_lines(self, file_path):
+        """Count lines in a log file, resuming from the offset saved in the catalogue"""
+        name = os.path.basename(file_path)
+        size = os.path.getsize(file_path)
+        counted, newlines = self.catalogue.line_index(name)
+        if size < counted:
+            # File was truncated or replaced, start over
+            counted, newlines = 0, 0
+        
+        last_byte = b''
+        with open(file_path, 'rb') as f:
+            f.seek(counted)
+            while True:
+                chunk = f.read(65536)
+                if not chunk:
+                    break
+                newlines += chunk.count(b'\n')
+                counted += len(chunk)
+                last_byte = chunk[-1:]
+            if not last_byte and counted > 0:
+                f.seek(counted - 1)
+                last_byte = f.read(1)
+        
+        self.catalogue.set_line_index(name, counted, newlines)
+        # A trailing line without a newline still counts as a line
+        if counted > 0 and last_byte != b'\n':
+            return newlines + 1
+        return newlines
+    
     def _format_size(self, size_bytes):
         """Format file size"""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -359,12 +1022,138 @@ class ServerManager:
             size_bytes /= 1024.0
         return f"{size_bytes:.2f} TB"
 
-# Create server manager instance
-server_manager = ServerManager()
+# Create server manager instance. Worker processes started with "spawn"
+# (the default on Windows and macOS) re-import this module and must not
+# touch the capture server.
+if parent_process() is None:
+    server_manager = ServerManager()
+    server_manager.catalogue.start()
+    server_manager.start_external_ip_discovery()
+
+def file_etag(file_path):
+    """Build an ETag from a file's size and modification time"""
+    stat = os.stat(file_path)
+    return f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+def not_modified(etag):
+    """Build a 304 response if the client already has this ETag, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+def conditional_response(response):
+    """Tag a response with an ETag of its body and honour If-None-Match"""
+    response.add_etag(weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def negotiate_download_encoding():
+    """Pick the best content coding the client accepts for downloads"""
+    accepted = request.accept_encodings
+    if zstandard is not None and accepted['zstd']:
+        return 'zstd'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def iter_file(file_path, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Yield a file in chunks"""
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def iter_encoded(chunks, encoding):
+    """Compress a stream of byte chunks on the fly"""
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        # wbits=31 produces a gzip container rather than raw deflate
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def format_time_ms(time_ms):
+    """Format epoch milliseconds as a local ISO timestamp, like the event timestamps"""
+    return datetime.fromtimestamp(time_ms / 1000).isoformat(timespec='milliseconds')
+
+def iter_session_slice(session_events, fields, players=None, events=None, start=None, end=None):
+    """Yield a session as JSON, keeping only the matching events
+    
+    session_events and fields come from session_export.iter_events; start
+    and end are epoch milliseconds. Events are read and written one at a
+    time so a slice of a large session is never held in memory or on disk.
+    server_start and players follow the events, as the source file only
+    reaches them after its events array.
+    """
+    def matches(event):
+        if players and event.get('player') not in players:
+            return False
+        if events and event.get('event') not in events:
+            return False
+        if start is not None or end is not None:
+            when = event_index.event_time_ms(event.get('timestamp'))
+            if when is None or (start is not None and when < start) or (end is not None and when > end):
+                return False
+        return True
+    
+    header = {
+        'filters': {
+            'players': sorted(players) if players else None,
+            'events': sorted(events) if events else None,
+            'start': format_time_ms(start) if start is not None else None,
+            'end': format_time_ms(end) if end is not None else None
+        }
+    }
+    yield json.dumps(header)[:-1].encode('utf-8') + b', "events": ['
+    first = True
+    for event in session_events:
+        if matches(event):
+            yield (b'' if first else b', ') + json.dumps(event).encode('utf-8')
+            first = False
+    footer = {
+        'server_start': fields.get('server_start'),
+        'players': {
+            name: info for name, info in fields.get('players', {}).items()
+            if not players or name in players
+        }
+    }
+    yield b'], ' + json.dumps(footer)[1:].encode('utf-8')
+
+@app.after_request
+def compress_response(response):
+    """Gzip sizeable text responses for clients that accept it"""
+    if request.path.startswith('/static/') and response.status_code == 200:
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+    
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'gzip' not in request.accept_encodings):
+        return response
+    
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/')
 def index():
-    return render_template('index2.html')
+    return conditional_response(make_response(render_template('index2.html')))
 
 @app.route('/api/start', methods=['POST'])
 def start_server():
@@ -379,7 +1168,6 @@ def stop_server():
 @app.route('/api/restart', methods=['POST'])
 def restart_server():
     server_manager.stop_server()
-    time.sleep(1)
     success, message = server_manager.start_server()
     return jsonify({'success': success, 'message': message})
 
@@ -387,9 +1175,63 @@ def restart_server():
 def get_status():
     return jsonify(server_manager.get_status())
 
+@app.route('/api/health')
+def get_health():
+    """Liveness check; 503 when the capture server runs but isn't listening"""
+    health = server_manager.get_health()
+    capture = health['capture_server']
+    healthy = not capture['running'] or capture['listening']
+    return jsonify(health), (200 if healthy else 503)
+
+@app.route('/api/stream')
+def stream_status():
+    """Push status, output, queue, file and leaderboard changes as Server-Sent Events"""
+    if not status_stream_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Too many open status streams; poll instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STREAM_RETRY_AFTER)
+        return response
+    
+    def release_when_closed(stream):
+        try:
+            yield from stream
+        finally:
+            status_stream_slots.release()
+    
+    # stream_with_context starts the generator, so the finally runs even if
+    # the client goes away before the first event
+    response = Response(stream_with_context(release_when_closed(server_manager.stream_status())),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/output')
+def get_output():
+    """Get console lines newer than the 'since' sequence number"""
+    since = request.args.get('since', default=0, type=int)
+    limit = request.args.get('limit', default=None, type=int)
+    first_seq, lines, next_seq = server_manager.output.since(since, limit)
+    return jsonify({
+        'lines': lines,
+        'first_seq': first_seq,
+        'next_seq': next_seq,
+        'truncated': first_seq > since
+    })
+
 @app.route('/api/files')
 def get_files():
-    return jsonify({'files': server_manager.get_data_files()})
+    """List data files, optionally sorted, filtered and paged"""
+    page = request.args.get('page', default=1, type=int)
+    per_page = request.args.get('per_page', default=None, type=int)
+    files, total = server_manager.get_data_files(
+        sort=request.args.get('sort', 'modified'),
+        order=request.args.get('order', 'desc'),
+        file_type=request.args.get('type'),
+        page=page,
+        per_page=per_page
+    )
+    return conditional_response(jsonify({'files': files, 'total': total, 'page': page, 'per_page': per_page}))
 
 @app.route('/api/clear-logs', methods=['POST'])
 def clear_logs():
@@ -408,167 +1250,334 @@ def send_command():
     success, message = server_manager.send_minecraft_command(command)
     return jsonify({'success': success, 'message': message})
 
+@app.route('/api/profile', methods=['POST'])
+def start_profile():
+    """Profile the capture server for a number of seconds; the report appears in the data files"""
+    data = request.get_json(silent=True) or {}
+    seconds = data.get('seconds', 30)
+    if not isinstance(seconds, int) or seconds < 1:
+        return jsonify({'success': False, 'message': 'seconds must be a positive integer'}), 400
+    
+    success, message = server_manager.send_control_request({'command': 'profile', 'seconds': seconds})
+    return jsonify({'success': success, 'message': message})
+
+@app.route('/api/leaderboards')
+def leaderboards():
+    """Top players by blocks, distance and messages, as last published by the capture server"""
+    leaderboards = server_manager.get_leaderboards()
+    if leaderboards is None:
+        return jsonify({'error': 'Capture server is not running'}), 404
+    return conditional_response(jsonify(leaderboards))
+
+@app.route('/api/subscriptions', methods=['GET', 'POST'])
+def subscriptions():
+    """GET lists the capture server's event subscriptions, POST changes them"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        subscribe = data.get('subscribe', [])
+        unsubscribe = data.get('unsubscribe', [])
+        if not isinstance(subscribe, list) or not isinstance(unsubscribe, list) or not (subscribe or unsubscribe):
+            return jsonify({'success': False, 'message': 'Give lists of events to subscribe and/or unsubscribe'}), 400
+        success, message = server_manager.send_control_request(
+            {'command': 'subscriptions', 'subscribe': subscribe, 'unsubscribe': unsubscribe})
+        return jsonify({'success': success, 'message': message})
+    
+    session = server_manager.read_session_summary()
+    if not server_manager.is_running or 'subscribed_events' not in session:
+        return jsonify({'error': 'Capture server is not running'}), 404
+    return jsonify({
+        'profile': session.get('event_profile'),
+        'subscribed': session['subscribed_events'],
+        'available': session.get('available_events', []),
+        'required': session.get('required_events', []),
+    })
+
+@app.route('/api/memory', methods=['GET', 'POST'])
+def memory_report():
+    """POST asks the capture server for a new memory report, GET returns the latest one"""
+    if request.method == 'POST':
+        success, message = server_manager.send_control_request({'command': 'memory'})
+        return jsonify({'success': success, 'message': message})
+    
+    try:
+        with open(server_manager.memory_report_file, 'r') as f:
+            return jsonify(json.load(f))
+    except FileNotFoundError:
+        return jsonify({'error': 'No memory report yet'}), 404
+    except ValueError as e:
+        return jsonify({'error': f'Could not read memory report: {e}'}), 500
+
 @app.route('/download/<filename>')
 def download_file(filename):
+    """Download a data file, compressed on the fly or as a byte range
+    
+    Query parameters player, event (both repeatable), start and end (ISO
+    timestamps or epoch ms) download only the matching events of a JSON
+    session.
+    """
+    file_path = safe_join(server_manager.data_folder, filename)
+    if file_path is None or not os.path.isfile(file_path):
+        return jsonify({'error': 'File not found'}), 404
+    
+    players = set(request.args.getlist('player'))
+    events = set(request.args.getlist('event'))
     try:
+        start = parse_query_time(request.args.get('start') or None)
+        end = parse_query_time(request.args.get('end') or None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    filtered = players or events or start is not None or end is not None
+    encoding = negotiate_download_encoding()
+    
+    if filtered:
+        if not filename.endswith('.json'):
+            return jsonify({'error': 'Filtering is only available for JSON files'}), 400
+        # As in export_file, the first event is read now so a broken file gets an error response
+        fields = {}
+        session_events = session_export.iter_events(file_path, fields=fields)
+        try:
+            first = next(session_events, None)
+        except ValueError as e:
+            return jsonify({'error': f'Could not read {filename}: {e}'}), 500
+        if first is not None:
+            session_events = itertools.chain([first], session_events)
+        body = iter_session_slice(session_events, fields, players, events, start, end)
+        download_name = filename[:-len('.json')] + '_filtered.json'
+    elif encoding is None or request.range is not None:
+        # Identity downloads honour Range and If-Range so they can be resumed
         return send_from_directory(server_manager.data_folder, filename, as_attachment=True)
-    except FileNotFoundError:
+    else:
+        body = iter_file(file_path)
+        download_name = filename
+    
+    if encoding:
+        body = iter_encoded(body, encoding)
+    response = Response(body, mimetype='text/plain' if filename.endswith('.log') else 'application/json')
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if not filtered:
+        response.set_etag(file_etag(file_path), weak=True)
+    return response
+
+@app.route('/api/export/<filename>')
+def export_file(filename):
+    """Stream a session's events as flat, typed columns in Parquet or CSV"""
+    export_format = request.args.get('format', 'parquet')
+    if export_format not in session_export.EXPORTERS:
+        return jsonify({'error': f'Unknown format: {export_format}'}), 400
+    if export_format == 'parquet' and session_export.pq is None:
+        return jsonify({'error': 'Parquet export needs pyarrow: pip install pyarrow'}), 501
+    
+    file_path = safe_join(server_manager.data_folder, filename)
+    if file_path is None or not filename.endswith('.json') or not os.path.isfile(file_path):
         return jsonify({'error': 'File not found'}), 404
+    # Events are decoded as the response streams; the first one is read now so
+    # an unreadable file still gets an error response instead of a cut-off download
+    events = session_export.iter_events(file_path)
+    try:
+        first = next(events, None)
+    except ValueError as e:
+        return jsonify({'error': f'Could not read {filename}: {e}'}), 500
+    if first is not None:
+        events = itertools.chain([first], events)
+    
+    exporter, extension, mimetype = session_export.EXPORTERS[export_format]
+    response = Response(exporter(events), mimetype=mimetype)
+    download_name = filename[:-len('.json')] + extension
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response
+
+query_indexes = event_index.IndexCache()
+analysis_pool = analysis_jobs.AnalysisJobs()
+
+def parse_query_time(value):
+    """Parse a query time given as epoch milliseconds or an ISO timestamp"""
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    time_ms = event_index.event_time_ms(value)
+    if time_ms is None:
+        raise ValueError(f"Invalid time: {value}")
+    return time_ms
+
+@app.route('/api/query')
+def query_events():
+    """Find events in a session by player, event type, time range and area
+    
+    Parameters: file (required), player and event (repeatable), start and
+    end (ISO or epoch ms), bbox (x1,z1,x2,z2 or x1,y1,z1,x2,y2,z2), page
+    and per_page.
+    """
+    filename = request.args.get('file', '')
+    file_path = safe_join(server_manager.data_folder, filename)
+    if file_path is None or not filename.endswith('.json') or not os.path.isfile(file_path):
+        return jsonify({'error': 'File not found'}), 404
+    
+    try:
+        start_ms = parse_query_time(request.args.get('start'))
+        end_ms = parse_query_time(request.args.get('end'))
+        bbox = None
+        if request.args.get('bbox'):
+            bbox = [float(v) for v in request.args['bbox'].split(',')]
+            if len(bbox) not in (4, 6):
+                raise ValueError("bbox needs 4 or 6 numbers")
+            # Accept corners in either order
+            half = len(bbox) // 2
+            bbox = [min(a, b) for a, b in zip(bbox[:half], bbox[half:])] + \
+                   [max(a, b) for a, b in zip(bbox[:half], bbox[half:])]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    page = max(request.args.get('page', default=1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', default=100, type=int), 1), 1000)
+    
+    try:
+        index = query_indexes.get(file_path)
+    except (OSError, ValueError) as e:
+        return jsonify({'error': f'Could not index {filename}: {e}'}), 500
+    matches = index.query(
+        players=set(request.args.getlist('player')),
+        events=set(request.args.getlist('event')),
+        start_ms=start_ms,
+        end_ms=end_ms,
+        bbox=bbox
+    )
+    page_numbers = matches[(page - 1) * per_page:page * per_page]
+    return jsonify({
+        'file': filename,
+        'total': len(matches),
+        'page': page,
+        'per_page': per_page,
+        'events': index.read_events(page_numbers)
+    })
+
+@app.route('/api/heatmap/<filename>')
+def get_heatmap(filename):
+    """X/Z activity heatmap of a session as a PNG or base64 int32 counts
+    
+    Parameters: layer (movement, placed, broken, blocks), cell (blocks per
+    cell), start and end (ISO or epoch ms) and format (png or json).
+    """
+    file_path = safe_join(server_manager.data_folder, filename)
+    if file_path is None or not filename.endswith('.json') or not os.path.isfile(file_path):
+        return jsonify({'error': 'File not found'}), 404
+    
+    layer = request.args.get('layer', 'movement')
+    if layer not in heatmap.LAYERS:
+        return jsonify({'error': f'Unknown layer: {layer}'}), 400
+    cell = min(max(request.args.get('cell', default=4, type=int), 1), 1024)
+    
+    etag = f"{file_etag(file_path)}-{zlib.crc32(request.query_string):x}"
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    try:
+        start_ms = parse_query_time(request.args.get('start'))
+        end_ms = parse_query_time(request.args.get('end'))
+        index = query_indexes.get(file_path)
+        result = heatmap.compute_heatmap(index, layer, cell, start_ms, end_ms)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if request.args.get('format', 'png') == 'json':
+        response = jsonify(heatmap.heatmap_to_json(result))
+    else:
+        response = Response(heatmap.heatmap_to_png(result), mimetype='image/png')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/analytics')
+def get_analytics():
+    """Aggregate report over all sessions, optionally limited to a date range"""
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    top = request.args.get('top', default=10, type=int)
+    area_size = request.args.get('area_size', default=archive_analytics.AREA_SIZE, type=int)
+    report = server_manager.analytics.report(start, end, top, area_size)
+    return conditional_response(jsonify(report))
 
 @app.route('/api/file-preview/<filename>')
 def preview_file(filename):
     try:
         file_path = os.path.join(server_manager.data_folder, filename)
         
+        # An unchanged file gives an unchanged preview, so skip reading it
+        etag = file_etag(file_path)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        
         if filename.endswith('.log'):
+            preview = {
+                'filename': filename,
+                'type': 'log',
+                'total_lines': server_manager.count_log_lines(file_path),
+                'preview_lines': server_manager.read_log_tail(file_path, 50)
+            }
+        else:
             with open(file_path, 'r') as f:
-                lines = f.readlines()
+                data = json.load(f)
                 preview = {
                     'filename': filename,
-                    'type': 'log',
-                    'total_lines': len(lines),
-                    'preview_lines': lines[-50:] if len(lines) > 50 else lines
+                    'type': 'data',
+                    'server_start_time': data.get('server_start'),
+                    'total_events': len(data.get('events', [])),
+                    'total_players': len(data.get('players', {})),
+                    'players': list(data.get('players', {}).keys()),
+                    'stats': data.get('stats', {})
                 }
-                return jsonify(preview)
         
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-            preview = {
-                'filename': filename,
-                'type': 'data',
-                'server_start_time': data.get('server_start'),
-                'total_events': len(data.get('events', [])),
-                'total_players': len(data.get('players', {})),
-                'players': list(data.get('players', {}).keys()),
-                'stats': data.get('stats', {})
-            }
-            return jsonify(preview)
+        response = jsonify(preview)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
 @app.route('/analyze/<filename>')
 def analyze_file(filename):
+    """Show the analysis of a session, starting it in the background if needed"""
+    if not filename.endswith('.json'):
+        return "Analysis only available for JSON files.", 400
+    file_path = safe_join(server_manager.data_folder, filename)
+    if file_path is None or not os.path.isfile(file_path):
+        return "File not found.", 404
     try:
-        file_path = os.path.join(server_manager.data_folder, filename)
-        if not filename.endswith('.json'):
-            return "Analysis only available for JSON files.", 400
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-
-        # Build player paths and block events
-        player_paths = {}
-        block_events = []  # List of dicts: {'type': 'placed'/'broken', 'player': ..., 'pos': (x, y, z)}
-        for event in data.get('events', []):
-            player = event.get('player')
-            if not player and event.get('data', {}).get('player'):
-                pd = event['data']['player']
-                player = pd.get('name') or pd.get('PlayerName')
-            if not player and event.get('data', {}).get('sender'):
-                player = event['data']['sender']
-            if not player:
-                continue
-
-            # Extract position
-            pos = None
-            pd = event.get('data', {}).get('player')
-            if pd and isinstance(pd, dict) and 'position' in pd:
-                pos = pd['position']
-            elif event.get('data', {}).get('position'):
-                pos = event['data']['position']
-            if pos:
-                if isinstance(pos, list) and len(pos) == 3:
-                    x, y, z = pos
-                elif isinstance(pos, dict):
-                    x = pos.get('x')
-                    y = pos.get('y')
-                    z = pos.get('z')
-                else:
-                    continue
-                if x is not None and y is not None and z is not None:
-                    player_paths.setdefault(player, []).append((float(x), float(y), float(z)))
-
-                    event_name = event.get('event') or event.get('type') or ""
-                    if event_name == "BlockPlaced":
-                        block_events.append({'type': 'placed', 'player': player, 'pos': (float(x), float(y), float(z))})
-                    elif event_name == "BlockBroken":
-                        block_events.append({'type': 'broken', 'player': player, 'pos': (float(x), float(y), float(z))})
-
-        # Create Plotly traces
-        traces = []
-        colors = [
-            'red', 'blue', 'green', 'orange', 'purple', 'cyan', 'magenta', 'yellow', 'brown', 'black'
-        ]
-        for idx, (player, points) in enumerate(player_paths.items()):
-            if not points:
-                continue
-            xs, ys, zs = zip(*points)
-            traces.append(go.Scatter3d(
-                x=xs, y=ys, z=zs,
-                mode='lines+markers',
-                name=player,
-                line=dict(color=colors[idx % len(colors)], width=4),
-                marker=dict(size=3),
-            ))
-
-        # BlockPlaced markers
-        placed_x, placed_y, placed_z, placed_players = [], [], [], []
-        broken_x, broken_y, broken_z, broken_players = [], [], [], []
-        for ev in block_events:
-            x, y, z = ev['pos']
-            if ev['type'] == 'placed':
-                placed_x.append(x)
-                placed_y.append(y)
-                placed_z.append(z)
-                placed_players.append(ev['player'])
-            elif ev['type'] == 'broken':
-                broken_x.append(x)
-                broken_y.append(y)
-                broken_z.append(z)
-                broken_players.append(ev['player'])
-        if placed_x:
-            traces.append(go.Scatter3d(
-                x=placed_x, y=placed_y, z=placed_z,
-                mode='markers',
-                name='Block Placed',
-                marker=dict(symbol='diamond', color='red', size=6),
-                text=placed_players,
-                hovertemplate='Block Placed by %{text}<br>(%{x}, %{y}, %{z})'
-            ))
-        if broken_x:
-            traces.append(go.Scatter3d(
-                x=broken_x, y=broken_y, z=broken_z,
-                mode='markers',
-                name='Block Broken',
-                marker=dict(symbol='x', color='blue', size=6),
-                text=broken_players,
-                hovertemplate='Block Broken by %{text}<br>(%{x}, %{y}, %{z})'
-            ))
-
-        layout = go.Layout(
-            title='3D Player Path Trace (with Block Placements/Breaks)',
-            scene=dict(
-                xaxis_title='X', yaxis_title='Y', zaxis_title='Z'
-            ),
-            width=900, height=650,
-            showlegend=True,
-            margin=dict(l=0, r=0, b=0, t=40)
-        )
-
-        fig = go.Figure(data=traces, layout=layout)
-        plot_html = pio.to_html(fig, full_html=False)
-
-        analysis = {
-            'filename': filename,
-            'server_start_time': data.get('server_start'),
-            'total_events': len(data.get('events', [])),
-            'total_players': len(data.get('players', {})),
-            'players': list(data.get('players', {}).keys()),
-            'stats': data.get('stats', {}),
-            'plot_html': plot_html,
-        }
-        return render_template('analyze.html', analysis=analysis)
+        job = analysis_pool.submit(file_path, filename)
     except Exception as e:
         return f"Error analyzing file: {str(e)}", 500
+    
+    if job['status'] == 'done':
+        return render_template('analyze.html', analysis=job['result'])
+    if job['status'] == 'failed':
+        return f"Error analyzing file: {job['error']}", 500
+    return render_template('analyze_pending.html', job=analysis_pool.describe(job))
+
+@app.route('/api/analyze/<filename>', methods=['POST'])
+def submit_analysis(filename):
+    """Queue an analysis job and return its id and progress"""
+    file_path = safe_join(server_manager.data_folder, filename)
+    if file_path is None or not filename.endswith('.json') or not os.path.isfile(file_path):
+        return jsonify({'error': 'File not found'}), 404
+    job = analysis_pool.submit(file_path, filename)
+    return jsonify(analysis_pool.describe(job))
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Get the status and progress of an analysis job"""
+    job = analysis_pool.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(analysis_pool.describe(job))
 
 def signal_handler(sig, frame):
     print('\nShutting down web server...')
@@ -576,17 +1585,44 @@ def signal_handler(sig, frame):
         server_manager.stop_server()
     sys.exit(0)
 
-signal.signal(signal.SIGINT, signal_handler)
+if parent_process() is None:
+    signal.signal(signal.SIGINT, signal_handler)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Minecraft Data Capture Web Interface")
+    parser.add_argument('--production', action='store_true',
+                        help="serve with the multi-threaded waitress WSGI server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=32,
+                        help="worker threads in production mode; each open dashboard holds one for its status stream")
+    parser.add_argument('--max-streams', type=int, default=None,
+                        help=f"open status streams allowed before dashboards fall back to polling "
+                             f"(default: threads - {STREAM_SPARE_THREADS} in production, {MAX_STATUS_STREAMS} otherwise)")
+    args = parser.parse_args()
+    
+    max_streams = args.max_streams
+    if max_streams is None:
+        max_streams = max(1, args.threads - STREAM_SPARE_THREADS) if args.production else MAX_STATUS_STREAMS
+    status_stream_slots = threading.BoundedSemaphore(max_streams)
+    
     print("=" * 60)
     print("Minecraft Data Capture Web Interface - Enhanced")
     print("=" * 60)
     print(f"Local IP: {server_manager.server_ip}")
-    print(f"External IP: {server_manager.external_ip}")
-    print(f"Starting web server on http://0.0.0.0:5000")
+    print(f"External IP: {server_manager.external_ip or 'detecting in background...'}")
+    print(f"Starting web server on http://{args.host}:{args.port}")
+    print(f"Mode: {'production (waitress)' if args.production else 'development (Flask)'}")
     print("Open this URL in your browser to access the interface")
     print("Press Ctrl+C to stop the web server")
     print("=" * 60)
     
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+    if args.production:
+        try:
+            from waitress import serve
+        except ImportError:
+            print("Production mode needs waitress: pip install waitress")
+            sys.exit(1)
+        serve(app, host=args.host, port=args.port, threads=args.threads)
+    else:
+        app.run(host=args.host, port=args.port, debug=False, threaded=True)
\ No newline at end of file
@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from session_export import flatten_event
+
+# Block activity is binned into 16x16 columns, the size of a Minecraft chunk
+AREA_SIZE = 16
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+CACHE_VERSION = 2
+# Day key for events without a usable timestamp; only counted in unbounded reports
+UNDATED = ""
+
+
+def is_session_file(filename):
+    """Check whether a file name looks like a captured session."""
+    return filename.startswith("MinecraftData_") and filename.endswith(".json")
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def summarize_session(path):
+    """Build the partial aggregate for one session file.
+
+    Runs in a worker process, so it only takes and returns plain data.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    # Player totals and block areas are kept per day so a date range can be applied to them
+    players = {}
+    areas = {}
+    days = Counter()
+    first = last = None
+    for event in data.get("events", []):
+        timestamp, event_name, player, x, _, z, _, _ = flatten_event(event)
+        day = UNDATED
+        if timestamp:
+            day = timestamp.date().isoformat()
+            days[day] += 1
+            first = day if first is None else min(first, day)
+            last = day if last is None else max(last, day)
+        if player:
+            totals = players.setdefault(day, {}).setdefault(player, Counter())
+            totals["events"] += 1
+            if event_name == "BlockPlaced":
+                totals["blocks_placed"] += 1
+            elif event_name == "BlockBroken":
+                totals["blocks_broken"] += 1
+            elif event_name == "PlayerMessage":
+                totals["messages"] += 1
+        if event_name == "BlockPlaced" and x is not None and z is not None:
+            areas.setdefault(day, Counter())[f"{int(x // AREA_SIZE)},{int(z // AREA_SIZE)}"] += 1
+
+    return {
+        "players": {
+            day: {name: dict(totals) for name, totals in day_players.items()}
+            for day, day_players in players.items()
+        },
+        "areas": {day: dict(counts) for day, counts in areas.items()},
+        "days": dict(days),
+        "first_day": first,
+        "last_day": last,
+    }
+
+
+class ArchiveAnalytics:
+    """Aggregate reports over every session in the data folder.
+
+    Each session is reduced to a small partial aggregate (per-player totals,
+    block placements per area and events, all per day) which is cached in
+    .analytics_cache.json with the file's size and mtime. A report only
+    summarizes files that are new or changed, in parallel across a process
+    pool, and then merges the cached partials.
+    """
+
+    def __init__(self, data_folder, max_workers=None):
+        self.data_folder = data_folder
+        self.max_workers = max_workers
+        self.cache_file = os.path.join(data_folder, ".analytics_cache.json")
+        self._lock = threading.Lock()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache.get("version") == CACHE_VERSION:
+                return cache["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _save_cache(self, partials):
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "files": partials}, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def update(self):
+        """Bring cached partials up to date and return them with the number of files processed."""
+        with self._lock:
+            partials = self._load_cache()
+            current = {}
+            for name in os.listdir(self.data_folder):
+                if is_session_file(name):
+                    current[name] = file_signature(os.path.join(self.data_folder, name))
+
+            stale = [
+                name for name, signature in current.items()
+                if partials.get(name, {}).get("signature") != signature
+            ]
+            removed = set(partials) - set(current)
+            for name in removed:
+                del partials[name]
+
+            if stale:
+                paths = [os.path.join(self.data_folder, name) for name in stale]
+                if len(stale) == 1:
+                    # Not worth starting a pool for a single new session
+                    results = [_try_summarize(paths[0])]
+                else:
+                    with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                        results = list(pool.map(_try_summarize, paths))
+                for name, result in zip(stale, results):
+                    if result is not None:
+                        result["signature"] = current[name]
+                        partials[name] = result
+
+            if stale or removed:
+                self._save_cache(partials)
+            return partials, len(stale)
+
+    def report(self, start=None, end=None, top=10, area_size=AREA_SIZE):
+        """Merge the partial aggregates of the days between start and end (dates, inclusive)."""
+        partials, processed = self.update()
+        start_day = start.isoformat() if start else None
+        end_day = end.isoformat() if end else None
+
+        players = {}
+        areas = Counter()
+        weekdays = Counter()
+        sessions = 0
+        scale = max(1, area_size // AREA_SIZE)
+        bounded = start_day or end_day
+
+        def in_range(day):
+            if day == UNDATED:
+                return not bounded
+            return not ((start_day and day < start_day) or (end_day and day > end_day))
+
+        for partial in partials.values():
+            if start_day and (partial["last_day"] or "") < start_day:
+                continue
+            if end_day and (partial["first_day"] or "9999") > end_day:
+                continue
+            sessions += 1
+            for day, day_players in partial["players"].items():
+                if in_range(day):
+                    for name, totals in day_players.items():
+                        players.setdefault(name, Counter()).update(totals)
+            for day, day_areas in partial["areas"].items():
+                if in_range(day):
+                    for key, count in day_areas.items():
+                        ax, az = (int(v) for v in key.split(","))
+                        areas[(ax // scale, az // scale)] += count
+            for day, count in partial["days"].items():
+                if in_range(day):
+                    weekdays[WEEKDAYS[date.fromisoformat(day).weekday()]] += count
+
+        cell = scale * AREA_SIZE
+        return {
+            "sessions": sessions,
+            "files_processed": processed,
+            "players": [
+                dict(totals, player=name)
+                for name, totals in sorted(players.items(), key=lambda item: -item[1]["events"])
+            ],
+            "most_built_areas": [
+                {"x": ax * cell, "z": az * cell, "size": cell, "blocks_placed": count}
+                for (ax, az), count in areas.most_common(top)
+            ],
+            "activity_by_weekday": [{"day": day, "events": weekdays.get(day, 0)} for day in WEEKDAYS],
+        }
+
+
+def _try_summarize(path):
+    try:
+        return summarize_session(path)
+    except (OSError, ValueError) as e:
+        print(f"Error summarizing {path}: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate statistics over all captured sessions")
+    parser.add_argument("--data", default="data", help="folder with MinecraftData_*.json files")
+    parser.add_argument("--start", type=date.fromisoformat, help="first day to include (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day to include (YYYY-MM-DD)")
+    parser.add_argument("--top", type=int, default=10, help="number of areas to list")
+    args = parser.parse_args()
+
+    print(json.dumps(ArchiveAnalytics(args.data).report(args.start, args.end, args.top), indent=2))
@@ -0,0 +1,177 @@
+import json
+import math
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+
+from session_export import flatten_event
+
+
+def event_time_ms(value):
+    """Convert an event timestamp (ISO string or epoch milliseconds) to epoch milliseconds."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        try:
+            return int(datetime.fromisoformat(value).timestamp() * 1000)
+        except ValueError:
+            return None
+    return None
+
+
+class SessionIndex:
+    """Per-file index of a captured session.
+
+    Holds the byte offset and length of every event in the JSON file plus its
+    time, position, player and event type. Events per player and per event
+    type are kept as ascending lists of event numbers, i.e. in time order, so
+    a query only touches events that can match and reads just those back
+    from disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        stat = os.stat(path)
+        self.signature = (stat.st_size, stat.st_mtime_ns)
+        self.offsets = array("q")
+        self.lengths = array("l")
+        self.times = array("q")
+        self.xs = array("d")
+        self.ys = array("d")
+        self.zs = array("d")
+        self.by_player = {}
+        self.by_event = {}
+        self._build()
+        self.time_ordered = all(a <= b for a, b in zip(self.times, self.times[1:]))
+
+    def _build(self):
+        # newline="" keeps \r\n intact so character and byte offsets line up
+        with open(self.path, "r", encoding="utf-8", newline="") as f:
+            text = f.read()
+
+        decoder = json.JSONDecoder()
+        start = text.find('"events"')
+        if start < 0:
+            return
+        pos = text.index("[", start) + 1
+        # Character offsets are converted to byte offsets as we go
+        byte_pos = len(text[:pos].encode("utf-8"))
+        length = len(text)
+        number = 0
+        while True:
+            while pos < length and text[pos] in " \t\r\n,":
+                pos += 1
+                byte_pos += 1
+            if pos >= length or text[pos] == "]":
+                break
+            event, end = decoder.raw_decode(text, pos)
+            byte_length = len(text[pos:end].encode("utf-8"))
+            self._add(number, event, byte_pos, byte_length)
+            byte_pos += byte_length
+            pos = end
+            number += 1
+
+    def _add(self, number, event, offset, length):
+        timestamp, event_name, player, x, y, z, _, _ = flatten_event(event)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.times.append(int(timestamp.timestamp() * 1000) if timestamp else 0)
+        self.xs.append(x if x is not None else math.nan)
+        self.ys.append(y if y is not None else math.nan)
+        self.zs.append(z if z is not None else math.nan)
+        if player:
+            self.by_player.setdefault(player, array("l")).append(number)
+        if event_name:
+            self.by_event.setdefault(event_name, array("l")).append(number)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _candidates(self, players, events):
+        """Event numbers matching the player and event filters, in time order."""
+        groups = []
+        for names, lookup in ((players, self.by_player), (events, self.by_event)):
+            if names:
+                numbers = set()
+                for name in names:
+                    numbers.update(lookup.get(name, ()))
+                groups.append(numbers)
+        if not groups:
+            return range(len(self))
+        groups.sort(key=len)
+        matches = groups[0].intersection(*groups[1:])
+        return sorted(matches)
+
+    def query(self, players=None, events=None, start_ms=None, end_ms=None, bbox=None):
+        """Return the numbers of all matching events in time order.
+
+        bbox is (min_x, min_z, max_x, max_z) or (min_x, min_y, min_z, max_x,
+        max_y, max_z); events without a position never match a bbox.
+        """
+        candidates = self._candidates(players, events)
+
+        if start_ms is not None or end_ms is not None:
+            if self.time_ordered:
+                times = self.times
+                lo = 0 if start_ms is None else bisect_left(candidates, start_ms, key=lambda n: times[n])
+                hi = len(candidates) if end_ms is None else bisect_right(candidates, end_ms, key=lambda n: times[n])
+                candidates = candidates[lo:hi]
+            else:
+                candidates = [
+                    n for n in candidates
+                    if (start_ms is None or self.times[n] >= start_ms)
+                    and (end_ms is None or self.times[n] <= end_ms)
+                ]
+
+        if bbox:
+            if len(bbox) == 4:
+                min_x, min_z, max_x, max_z = bbox
+                min_y, max_y = -math.inf, math.inf
+            else:
+                min_x, min_y, min_z, max_x, max_y, max_z = bbox
+            xs, ys, zs = self.xs, self.ys, self.zs
+            # NaN comparisons are False, so unpositioned events drop out here
+            candidates = [
+                n for n in candidates
+                if min_x <= xs[n] <= max_x and min_y <= ys[n] <= max_y and min_z <= zs[n] <= max_z
+            ]
+
+        return candidates
+
+    def read_events(self, numbers):
+        """Load the given events from the file by seeking to their offsets."""
+        events = []
+        with open(self.path, "rb") as f:
+            for n in numbers:
+                f.seek(self.offsets[n])
+                events.append(json.loads(f.read(self.lengths[n])))
+        return events
+
+
+class IndexCache:
+    """Keeps the most recently used session indexes, rebuilding them when a file changes."""
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            index = self._indexes.get(path)
+            if index is not None and index.signature == signature:
+                self._indexes.move_to_end(path)
+                return index
+
+        index = SessionIndex(path)
+        with self._lock:
+            self._indexes[path] = index
+            self._indexes.move_to_end(path)
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
@@ -0,0 +1,112 @@
+import base64
+import struct
+import zlib
+
+import numpy as np
+
+LAYERS = ("movement", "placed", "broken", "blocks")
+MAX_CELLS = 1024 * 1024
+
+
+def _event_mask(index, layer):
+    """Boolean mask over all events in a SessionIndex for the given layer."""
+    if layer == "movement":
+        return np.ones(len(index), dtype=bool)
+    names = {"placed": ["BlockPlaced"], "broken": ["BlockBroken"], "blocks": ["BlockPlaced", "BlockBroken"]}[layer]
+    mask = np.zeros(len(index), dtype=bool)
+    for name in names:
+        numbers = index.by_event.get(name)
+        if numbers:
+            mask[np.asarray(numbers)] = True
+    return mask
+
+
+def compute_heatmap(index, layer="movement", cell=4, start_ms=None, end_ms=None):
+    """Count events per X/Z cell of a session.
+
+    The grid always covers every positioned event of the session, so maps for
+    different time windows line up when stepping through them with a slider.
+    Returns a dict with the int32 counts (rows are Z, columns X) and the
+    grid geometry.
+    """
+    xs = np.frombuffer(index.xs, dtype=np.float64)
+    zs = np.frombuffer(index.zs, dtype=np.float64)
+    times = np.frombuffer(index.times, dtype=np.int64)
+
+    positioned = ~(np.isnan(xs) | np.isnan(zs))
+    if positioned.any():
+        x0 = np.floor(xs[positioned].min() / cell) * cell
+        z0 = np.floor(zs[positioned].min() / cell) * cell
+        width = int((xs[positioned].max() - x0) // cell) + 1
+        height = int((zs[positioned].max() - z0) // cell) + 1
+    else:
+        x0 = z0 = 0.0
+        width = height = 1
+    if width * height > MAX_CELLS:
+        raise ValueError(f"{width}x{height} cells is too large; use a bigger cell size")
+
+    mask = positioned & _event_mask(index, layer)
+    if start_ms is not None:
+        mask &= times >= start_ms
+    if end_ms is not None:
+        mask &= times <= end_ms
+
+    counts, _, _ = np.histogram2d(
+        zs[mask], xs[mask],
+        bins=[height, width],
+        range=[[z0, z0 + height * cell], [x0, x0 + width * cell]],
+    )
+    has_times = times[positioned & (times > 0)]
+    return {
+        "counts": counts.astype(np.int32),
+        "x0": float(x0),
+        "z0": float(z0),
+        "cell": cell,
+        "width": width,
+        "height": height,
+        "events": int(mask.sum()),
+        "time_min": int(has_times.min()) if has_times.size else None,
+        "time_max": int(has_times.max()) if has_times.size else None,
+    }
+
+
+def heatmap_to_json(heatmap):
+    """Serialize counts compactly as base64 little-endian int32, row by row."""
+    result = {key: value for key, value in heatmap.items() if key != "counts"}
+    result["dtype"] = "int32"
+    result["counts"] = base64.b64encode(heatmap["counts"].astype("<i4").tobytes()).decode("ascii")
+    result["max_count"] = int(heatmap["counts"].max())
+    return result
+
+
+def _palette():
+    """256-entry black-red-yellow-white colour ramp."""
+    v = np.linspace(0.0, 1.0, 256)
+    r = np.clip(v * 3, 0, 1)
+    g = np.clip(v * 3 - 1, 0, 1)
+    b = np.clip(v * 3 - 2, 0, 1)
+    return (np.stack([r, g, b], axis=1) * 255).astype(np.uint8)
+
+
+PALETTE = _palette()
+
+
+def heatmap_to_png(heatmap):
+    """Render counts as an RGB PNG, one pixel per cell, on a log colour scale."""
+    counts = heatmap["counts"]
+    scaled = np.log1p(counts.astype(np.float64))
+    peak = scaled.max()
+    levels = (scaled / peak * 255).astype(np.uint8) if peak > 0 else np.zeros(counts.shape, np.uint8)
+    # North (negative Z) at the top of the image
+    rgb = PALETTE[levels]
+    height, width = counts.shape
+
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgb.reshape(height, width * 3)
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)) + chunk(b"IEND", b""))
@@ -0,0 +1,64 @@
+import heapq
+
+
+class Leaderboard:
+    """Running per-player totals with cheap top-K queries.
+
+    Every change pushes the player's new total onto a max-heap in O(log n);
+    entries whose score is no longer current are skipped when they surface
+    and the heap is rebuilt once stale entries outnumber live ones, so a
+    top-K query costs O(K log n) amortized instead of a sort of all players.
+    """
+
+    def __init__(self):
+        self.scores = {}
+        self._heap = []
+
+    def add(self, player, amount):
+        score = self.scores.get(player, 0) + amount
+        self.scores[player] = score
+        heapq.heappush(self._heap, (-score, player))
+        if len(self._heap) > 2 * len(self.scores) + 64:
+            self._heap = [(-s, p) for p, s in self.scores.items()]
+            heapq.heapify(self._heap)
+        return score
+
+    def top(self, k=10):
+        """Return up to k (player, score) pairs, highest first."""
+        result = []
+        seen = set()
+        while self._heap and len(result) < k:
+            neg_score, player = heapq.heappop(self._heap)
+            # Stale entry, or a duplicate pushed by an update of zero
+            if self.scores.get(player) != -neg_score or player in seen:
+                continue
+            seen.add(player)
+            result.append((player, -neg_score))
+        for player, score in result:
+            heapq.heappush(self._heap, (-score, player))
+        return result
+
+
+class Leaderboards:
+    """The leaderboards kept by the capture server, by metric name."""
+
+    METRICS = ("blocks", "distance", "messages")
+
+    def __init__(self):
+        self.boards = {metric: Leaderboard() for metric in self.METRICS}
+
+    def add(self, metric, player, amount=1):
+        return self.boards[metric].add(player, amount)
+
+    def top(self, metric, k=10):
+        return self.boards[metric].top(k)
+
+    def summary(self, k=10):
+        """Top k of every metric as JSON-ready lists."""
+        return {
+            metric: [
+                {"player": player, "score": round(score, 1) if isinstance(score, float) else score}
+                for player, score in board.top(k)
+            ]
+            for metric, board in self.boards.items()
+        }
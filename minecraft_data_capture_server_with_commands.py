@@ -3,11 +3,24 @@ import websockets
 import json
 import uuid
 import sys
+import time
+import math
+import itertools
 import socket
+import cProfile
+import io
+import pstats
+import tracemalloc
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 import threading
 import queue
+from collections import OrderedDict, deque
+
+from minecraft_events import normalize_event
+from region_triggers import RegionWatcher
+from leaderboards import Leaderboards
 
 # Force output to be unbuffered
 import os
@@ -29,7 +42,11 @@ timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 DATA_FILE = DATA_DIR / f"MinecraftData_{timestamp}.json"
 LOG_FILE = DATA_DIR / f"server_{timestamp}.log"
 COMMAND_FILE = DATA_DIR / "pending_commands.json"
+SESSION_FILE = DATA_DIR / "active_session.json"
+CONTROL_FILE = DATA_DIR / "control_requests.json"
+MEMORY_REPORT_FILE = DATA_DIR / "memory_report.json"
 STRUCTURES_FILE = Path("structures.json")
+REGIONS_FILE = Path("regions.json")
 
 # Main data structure
 minecraft_data = {
@@ -55,11 +72,351 @@ MINECRAFT_EVENTS = [
     "PlayerTravelled"
 ]
 
+# Subscription profiles; pick one per deployment with EVENT_PROFILE, which
+# may also be a comma separated list of event names
+EVENT_PROFILES = {
+    "full": MINECRAFT_EVENTS,
+    "activity": [e for e in MINECRAFT_EVENTS if e not in ("PlayerTransform", "PlayerTravelled")],
+    "building": ["PlayerJoin", "PlayerLeave", "PlayerMessage", "BlockPlaced", "BlockBroken"],
+    "chat": ["PlayerJoin", "PlayerLeave", "PlayerMessage"],
+}
+# Chat commands arrive as PlayerMessage, so it is always subscribed
+REQUIRED_EVENTS = {"PlayerMessage"}
+
+def load_event_profile(profile):
+    """Resolve a profile name or event list to the set of events to subscribe to."""
+    if profile in EVENT_PROFILES:
+        names = EVENT_PROFILES[profile]
+    else:
+        names = [name.strip() for name in profile.split(",") if name.strip()]
+        unknown = [name for name in names if name not in MINECRAFT_EVENTS]
+        if unknown:
+            print(f"Warning: ignoring unknown events in EVENT_PROFILE: {', '.join(unknown)}", flush=True)
+        names = [name for name in names if name in MINECRAFT_EVENTS]
+    return set(names) | REQUIRED_EVENTS
+
+EVENT_PROFILE = os.environ.get("EVENT_PROFILE", "full")
+# Events subscribed on every connection; changed at runtime by !subscribe/!unsubscribe and the web interface
+active_events = load_event_profile(EVENT_PROFILE)
+
+# Identical commands queued again within this many seconds are dropped
+DUPLICATE_WINDOW = float(os.environ.get("COMMAND_DUPLICATE_WINDOW", "2"))
+
+def coalesce_key(command):
+    """Key under which a pending command is replaced by a newer one, or None.
+
+    time set, weather and gamerule only have an effect through their last
+    value, so a pending one is superseded by the next of the same kind.
+    """
+    parts = command.lstrip("/").split()
+    if not parts:
+        return None
+    name = parts[0].lower()
+    if name == "time" and len(parts) > 1 and parts[1].lower() == "set":
+        return "time set"
+    if name == "weather":
+        return "weather"
+    if name == "gamerule" and len(parts) > 2:
+        return f"gamerule {parts[1].lower()}"
+    return None
+
+class CommandQueue:
+    """Queue of web interface commands that collapses bursts.
+
+    Commands waiting in the queue are coalesced by coalesce_key(), keeping
+    their place in line but taking the newest value, and a command identical
+    to one queued in the last DUPLICATE_WINDOW seconds is dropped.
+    Implements the parts of queue.Queue the server uses.
+    """
+
+    def __init__(self, duplicate_window=DUPLICATE_WINDOW):
+        self.duplicate_window = duplicate_window
+        self._pending = OrderedDict()
+        self._recent = {}
+        # Pending keys for commands that are never coalesced
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.dropped = 0
+
+    def put(self, command):
+        """Queue a command; returns False if it was dropped as a duplicate."""
+        now = time.monotonic()
+        pending_key = coalesce_key(command)
+        key = pending_key or command
+        with self._lock:
+            # Only a repeat of the latest command of its kind is a duplicate,
+            # so "time set day" after "time set night" still goes through
+            last_command, last_time = self._recent.get(key, (None, 0))
+            if last_command == command and now - last_time < self.duplicate_window:
+                self.dropped += 1
+                return False
+            if len(self._recent) > 1000:
+                self._recent = {k: v for k, v in self._recent.items() if now - v[1] < self.duplicate_window}
+            self._recent[key] = (command, now)
+            
+            # Only idempotent commands replace a pending one; a second
+            # "give" outside the window is meant and runs twice
+            if pending_key is None:
+                pending_key = next(self._sequence)
+            elif pending_key in self._pending:
+                self.coalesced += 1
+            self._pending[pending_key] = command
+            return True
+
+    def get_nowait(self):
+        with self._lock:
+            if not self._pending:
+                raise queue.Empty
+            return self._pending.popitem(last=False)[1]
+
+    def empty(self):
+        return not self._pending
+
+    def qsize(self):
+        return len(self._pending)
+
 # Global command queue
-command_queue = queue.Queue()
+command_queue = CommandQueue()
 
 # Track player positions
 player_positions = {}
+# Events whose position updates player_positions
+POSITION_EVENTS = ("PlayerTransform", "PlayerTravelled", "BlockPlaced", "BlockBroken")
+# Moves longer than this between two updates are teleports or respawns, not travel
+MAX_TRAVEL_STEP = 64
+
+# Top-K boards for !top and the web interface
+leaderboards = Leaderboards()
+
+def track_position(player_name, position):
+    """Store a player's latest position and add the distance from the previous one to the leaderboard."""
+    previous = player_positions.get(player_name)
+    if previous is not None:
+        step = math.dist((previous["x"], previous["y"], previous["z"]), (position["x"], position["y"], position["z"]))
+        if 0 < step <= MAX_TRAVEL_STEP:
+            leaderboards.add("distance", player_name, step)
+    player_positions[player_name] = position
+    minecraft_data["players"][player_name]["last_position"] = dict(position)
+
+def format_time_ms(time_ms):
+    """Format epoch milliseconds as a local ISO timestamp for the data file."""
+    return datetime.fromtimestamp(time_ms / 1000).isoformat(timespec="milliseconds")
+
+def clock_time(time_ms):
+    """Format epoch milliseconds as HH:MM:SS for log lines."""
+    return time.strftime("%H:%M:%S", time.localtime(time_ms // 1000))
+
+class CapturedEvent:
+    """One captured event, kept compact in memory for long sessions.
+
+    Names are interned so every event shares the same string objects, the
+    time is epoch milliseconds and the raw body is kept as its compact JSON
+    text rather than a tree of dicts. to_json() writes the same shape as the
+    event dicts in the data file.
+    """
+    __slots__ = ("time_ms", "event", "player", "x", "y", "z", "block", "item", "body_json", "client_ip")
+
+    def __init__(self, time_ms, event_name, normalized, body, client_ip):
+        self.time_ms = time_ms
+        self.event = sys.intern(event_name)
+        player = normalized.get("player")
+        self.player = sys.intern(player) if player else None
+        self.x = normalized.get("x")
+        self.y = normalized.get("y")
+        self.z = normalized.get("z")
+        block = normalized.get("block")
+        self.block = sys.intern(block) if block else None
+        item = normalized.get("item")
+        self.item = sys.intern(item) if item else None
+        self.body_json = json.dumps(body, separators=(",", ":"), ensure_ascii=False)
+        self.client_ip = client_ip
+
+    def normalized(self):
+        record = {}
+        for key in ("player", "x", "y", "z", "block", "item"):
+            value = getattr(self, key)
+            if value is not None:
+                record[key] = value
+        return record
+
+    def to_json(self):
+        # The body is spliced in as-is instead of being parsed back
+        return (
+            f'{{"timestamp": "{format_time_ms(self.time_ms)}", '
+            f'"event": {json.dumps(self.event)}, '
+            f'"player": {json.dumps(self.player)}, '
+            f'"data": {self.body_json}, '
+            f'"normalized": {json.dumps(self.normalized())}, '
+            f'"client_ip": {json.dumps(self.client_ip)}}}'
+        )
+
+class TimingStats:
+    """Timing histograms for event handlers and I/O operations.
+
+    Durations go into power-of-two microsecond buckets, so recording is a
+    couple of integer operations and the report can still show percentiles.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.totals = {}
+        self.maxima = {}
+
+    def record(self, name, seconds):
+        micros = int(seconds * 1_000_000)
+        buckets = self.histograms.get(name)
+        if buckets is None:
+            buckets = self.histograms[name] = [0] * 32
+            self.totals[name] = 0
+            self.maxima[name] = 0
+        buckets[min(micros.bit_length(), 31)] += 1
+        self.totals[name] += micros
+        if micros > self.maxima[name]:
+            self.maxima[name] = micros
+
+    @contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def _percentile(self, name, count, fraction):
+        # Upper bound of the bucket holding the requested rank, capped at the maximum seen
+        rank = fraction * count
+        seen = 0
+        for i, n in enumerate(self.histograms[name]):
+            seen += n
+            if seen >= rank:
+                return min((1 << i) - 1, self.maxima[name])
+        return self.maxima[name]
+
+    def report(self):
+        """Return a text table of count, mean, p50, p99 and max per operation."""
+        lines = [f"{'operation':<32} {'count':>9} {'mean us':>10} {'p50 us':>10} {'p99 us':>10} {'max us':>10}"]
+        for name in sorted(self.histograms, key=lambda n: -self.totals[n]):
+            count = sum(self.histograms[name])
+            lines.append(
+                f"{name:<32} {count:>9} {self.totals[name] // count:>10} "
+                f"{self._percentile(name, count, 0.5):>10} {self._percentile(name, count, 0.99):>10} {self.maxima[name]:>10}"
+            )
+        return "\n".join(lines)
+
+timings = TimingStats()
+
+# Players allowed to use !profile from chat (comma separated); the web interface can always start it
+OPERATORS = {name.strip() for name in os.environ.get("OPERATORS", "").split(",") if name.strip()}
+MAX_PROFILE_SECONDS = 300
+active_profiler = None
+
+def start_profile(seconds, requested_by):
+    """Run cProfile on the event loop for the given number of seconds.
+
+    The report, including the timing histograms, is written to data/ when
+    the run finishes. Returns False if a profile is already running.
+    """
+    global active_profiler
+    if active_profiler is not None:
+        return False
+    seconds = max(1, min(int(seconds), MAX_PROFILE_SECONDS))
+    active_profiler = cProfile.Profile()
+    active_profiler.enable()
+    asyncio.get_running_loop().call_later(seconds, finish_profile, seconds, requested_by)
+    log_message(f"Profiling for {seconds}s (requested by {requested_by})")
+    return True
+
+def finish_profile(seconds, requested_by):
+    """Stop the running profile and write its report."""
+    global active_profiler
+    profiler, active_profiler = active_profiler, None
+    profiler.disable()
+    
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(40)
+    report_file = DATA_DIR / f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    with open(report_file, "w", encoding="utf-8") as f:
+        f.write(f"Profile of {seconds}s requested by {requested_by}\n\n")
+        f.write("Timings since server start\n")
+        f.write(timings.report() + "\n\n")
+        f.write(stream.getvalue())
+    log_message(f"Profile written to {report_file}")
+
+# psutil is optional here; without it the report leaves out the process size
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Players not seen for this long are counted as stale in the memory report
+STALE_PLAYER_MS = 10 * 60 * 1000
+# Tracing slows event handling several times over, so it is opt-in: set
+# TRACEMALLOC=1 (or run with -X tracemalloc) to trace for the whole session
+if os.environ.get("TRACEMALLOC") == "1":
+    tracemalloc.start()
+last_memory_snapshot = None
+last_structure_sizes = {}
+
+def structure_sizes(now_ms):
+    """Measure the structures that grow with a session."""
+    events = minecraft_data["events"]
+    event_bytes = sum(sys.getsizeof(e) + sys.getsizeof(e.body_json) for e in events)
+    players = minecraft_data["players"]
+    player_bytes = sum(sys.getsizeof(name) + sys.getsizeof(stats) for name, stats in players.items())
+    stale_positions = [
+        name for name in player_positions
+        if now_ms - players.get(name, {}).get("last_seen", 0) > STALE_PLAYER_MS
+    ]
+    return {
+        "events": {"count": len(events), "bytes": event_bytes},
+        "players": {"count": len(players), "bytes": player_bytes},
+        "player_positions": {"count": len(player_positions), "stale": len(stale_positions), "stale_players": stale_positions[:20]},
+        "command_queue": {"count": command_queue.qsize(), "coalesced": command_queue.coalesced, "dropped": command_queue.dropped},
+    }
+
+def write_memory_report(top=15):
+    """Write structure sizes, growth since the last report and, when tracing is on, top allocators to data/."""
+    global last_memory_snapshot, last_structure_sizes
+    now_ms = time.time_ns() // 1_000_000
+    report = {
+        "time": format_time_ms(now_ms),
+        "rss_bytes": psutil.Process().memory_info().rss if psutil else None,
+        "tracemalloc": {"enabled": tracemalloc.is_tracing()},
+        "structures": structure_sizes(now_ms),
+    }
+    
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        report["tracemalloc"].update({
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {"location": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:top]
+            ],
+            "growth": [
+                {"location": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for stat in snapshot.compare_to(last_memory_snapshot, "lineno")[:top]
+                if stat.size_diff
+            ] if last_memory_snapshot is not None else [],
+        })
+        last_memory_snapshot = snapshot
+    
+    report["structure_growth"] = {
+        name: {key: sizes[key] - last_structure_sizes[name][key] for key in ("count", "bytes") if key in sizes}
+        for name, sizes in report["structures"].items() if name in last_structure_sizes
+    }
+    last_structure_sizes = report["structures"]
+    
+    with open(MEMORY_REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    log_message(f"Memory report written to {MEMORY_REPORT_FILE}")
 
 # Load structures from file
 STRUCTURES = {}
@@ -74,8 +431,96 @@ try:
 except Exception as e:
     print(f"Error loading structures: {e}")
 
-def log_message(message):
-    """Log message to both console and file"""
+# Region triggers; regions.json is reloaded whenever it changes
+region_watcher = RegionWatcher(REGIONS_FILE)
+try:
+    region_count = region_watcher.check()
+    if region_count is None:
+        print(f"No {REGIONS_FILE} found, region triggers are off")
+    else:
+        print(f"Loaded {region_count} regions from {REGIONS_FILE}")
+except Exception as e:
+    print(f"Error loading regions: {e}")
+
+# Logging controls. Only log lines are affected; every event still goes to the data file.
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+LOG_LEVEL = LOG_LEVELS.get(os.environ.get("LOG_LEVEL", "INFO").upper(), 20)
+# "text" keeps the readable lines, "json" writes one JSON object per line
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+# Maximum log lines per second for each event type (0 = no limit)
+LOG_EVENT_RATE = float(os.environ.get("LOG_EVENT_RATE", "20"))
+# Log only every Nth event of a type, e.g. "BlockPlaced=10,BlockBroken=10"
+LOG_SAMPLE = {
+    name.strip(): max(1, int(every))
+    for name, _, every in (item.partition("=") for item in os.environ.get("LOG_SAMPLE", "").split(","))
+    if name.strip() and every.strip().isdigit()
+}
+
+class EventLogLimiter:
+    """Decides which per-event log lines are written.
+
+    Applies the LOG_SAMPLE 1-in-N sampling and then a per-second budget per
+    event type, counting what was dropped so the next line written for that
+    type can say so.
+    """
+
+    def __init__(self, rate, sample):
+        self.rate = rate
+        self.sample = sample
+        self.seen = {}
+        self.windows = {}
+        self.suppressed = {}
+
+    def allow(self, event):
+        """Return (allowed, lines suppressed since the last allowed line) for an event type."""
+        seen = self.seen.get(event, 0) + 1
+        self.seen[event] = seen
+        allowed = seen % self.sample.get(event, 1) == 0
+        if allowed and self.rate > 0:
+            now = time.monotonic()
+            window_start, count = self.windows.get(event, (now, 0))
+            if now - window_start >= 1:
+                window_start, count = now, 0
+            allowed = count < self.rate
+            self.windows[event] = (window_start, count + 1 if allowed else count)
+        if not allowed:
+            self.suppressed[event] = self.suppressed.get(event, 0) + 1
+            return False, 0
+        return True, self.suppressed.pop(event, 0)
+
+event_log_limiter = EventLogLimiter(LOG_EVENT_RATE, LOG_SAMPLE)
+_log_file = None
+
+def log_message(message, level="INFO", event=None, **fields):
+    """Log message to both console and file.
+
+    Lines below LOG_LEVEL are dropped. Lines tagged with an event type go
+    through the sampling and rate limits; extra keyword fields are included
+    in JSON output.
+    """
+    global _log_file
+    if LOG_LEVELS.get(level, 20) < LOG_LEVEL:
+        return
+    if event is not None:
+        allowed, suppressed = event_log_limiter.allow(event)
+        if not allowed:
+            return
+        if suppressed:
+            fields["suppressed"] = suppressed
+            if LOG_FORMAT != "json":
+                message += f" (+{suppressed} {event} lines suppressed)"
+    
+    now = datetime.now().isoformat(timespec="milliseconds")
+    if LOG_FORMAT == "json":
+        record = {"time": now, "level": level, "message": message}
+        if event is not None:
+            record["event"] = event
+        record.update(fields)
+        file_line = json.dumps(record, ensure_ascii=False)
+        message = json.dumps(record)
+    else:
+        file_line = f"{now} - {message}"
+    
     # Replace emojis with ASCII for console compatibility
     console_message = message
     if sys.platform == "win32":
@@ -95,11 +540,13 @@ def log_message(message):
         for emoji, text in replacements.items():
             console_message = console_message.replace(emoji, text)
     
-    print(console_message, flush=True)
-    
-    # Keep emojis in log file
-    with open(LOG_FILE, "a", encoding='utf-8') as f:
-        f.write(f"{datetime.now().isoformat()} - {message}\n")
+    with timings.measure("io:log_message"):
+        print(console_message, flush=True)
+        
+        # Keep emojis in log file; the file stays open, line buffered so it can be tailed
+        if _log_file is None:
+            _log_file = open(LOG_FILE, "a", encoding='utf-8', buffering=1)
+        _log_file.write(file_line + "\n")
 
 def get_local_ip():
     """Get the local IP address of this machine."""
@@ -112,16 +559,58 @@ def get_local_ip():
     except Exception:
         return "localhost"
 
+# Events recorded since the last save; the handler saves every 10
+unsaved_events = 0
+
+def record_event(event_entry):
+    """Store a captured event and count it in the stats and towards the next save."""
+    global unsaved_events
+    minecraft_data["events"].append(event_entry)
+    minecraft_data["stats"]["total_events"] += 1
+    unsaved_events += 1
+
 def save_data():
     """Save the minecraft data to JSON file."""
+    global unsaved_events
     try:
-        with DATA_FILE.open("w", encoding='utf-8') as f:
-            json.dump(minecraft_data, f, indent=2)
+        with timings.measure("io:save_data"), DATA_FILE.open("w", encoding='utf-8') as f:
+            # Same layout as json.dump(minecraft_data), but events serialize themselves
+            f.write('{\n  "server_start": ' + json.dumps(minecraft_data["server_start"]) + ',\n  "events": [')
+            for i, event in enumerate(minecraft_data["events"]):
+                f.write(",\n    " if i else "\n    ")
+                f.write(event.to_json())
+            f.write('\n  ],\n')
+            # Player times are kept as epoch milliseconds and only formatted here
+            players = {
+                name: dict(player, first_seen=format_time_ms(player["first_seen"]), last_seen=format_time_ms(player["last_seen"]))
+                for name, player in minecraft_data["players"].items()
+            }
+            f.write('  "players": ' + json.dumps(players) + ',\n')
+            f.write('  "stats": ' + json.dumps(minecraft_data["stats"]) + '\n}\n')
+        save_session_summary()
+        unsaved_events = 0
         return True
     except Exception as e:
-        log_message(f"Error saving data: {e}")
+        log_message(f"Error saving data: {e}", level="ERROR")
         return False
 
+def save_session_summary():
+    """Tell the web interface which files are live and what they contain."""
+    summary = {
+        "data_file": DATA_FILE.name,
+        "log_file": LOG_FILE.name,
+        "event_count": len(minecraft_data["events"]),
+        "players": list(minecraft_data["players"].keys()),
+        "event_profile": EVENT_PROFILE,
+        "subscribed_events": sorted(active_events),
+        "available_events": MINECRAFT_EVENTS,
+        "required_events": sorted(REQUIRED_EVENTS),
+        "leaderboards": leaderboards.summary()
+    }
+    # Rewritten in place so the data folder itself is not modified
+    with SESSION_FILE.open("w", encoding='utf-8') as f:
+        json.dump(summary, f)
+
 def check_pending_commands():
     """Check for pending commands from the web interface"""
     try:
@@ -129,9 +618,10 @@ def check_pending_commands():
             with open(COMMAND_FILE, 'r', encoding='utf-8') as f:
                 commands = json.load(f)
             
-            # Add commands to queue
+            # Add commands to queue, collapsing repeats
             for cmd in commands:
-                command_queue.put(cmd)
+                if not command_queue.put(cmd):
+                    log_message(f"Dropped duplicate command: {cmd}", level="DEBUG")
             
             # Clear the file
             with open(COMMAND_FILE, 'w', encoding='utf-8') as f:
@@ -139,11 +629,52 @@ def check_pending_commands():
             
             return len(commands)
     except Exception as e:
-        log_message(f"Error checking pending commands: {e}")
+        log_message(f"Error checking pending commands: {e}", level="ERROR")
     return 0
 
-async def send_command(websocket, command_text):
-    """Send a command to Minecraft."""
+async def check_control_requests():
+    """Run diagnostics and subscription changes requested by the web interface through the control file."""
+    try:
+        if not CONTROL_FILE.exists():
+            return
+        with open(CONTROL_FILE, 'r', encoding='utf-8') as f:
+            pending = json.load(f)
+        if not pending:
+            return
+        with open(CONTROL_FILE, 'w', encoding='utf-8') as f:
+            json.dump([], f)
+        
+        for control in pending:
+            if control.get("command") == "profile":
+                if not start_profile(control.get("seconds", 30), "web interface"):
+                    log_message("Profile request ignored, a profile is already running", level="WARNING")
+            elif control.get("command") == "memory":
+                write_memory_report()
+            elif control.get("command") == "subscriptions":
+                await update_subscriptions(control.get("subscribe", []), control.get("unsubscribe", []))
+            else:
+                log_message(f"Unknown control request: {control}", level="WARNING")
+    except Exception as e:
+        log_message(f"Error checking control requests: {e}", level="ERROR")
+
+def reload_regions():
+    """Pick up edits to regions.json."""
+    try:
+        region_count = region_watcher.check()
+        if region_count is not None:
+            log_message(f"Reloaded {region_count} regions from {REGIONS_FILE}")
+    except Exception as e:
+        log_message(f"Error reloading regions: {e}", level="ERROR")
+
+async def control_checker():
+    """Poll the control file and the regions file once a second, independent of any connection."""
+    while True:
+        await check_control_requests()
+        reload_regions()
+        await asyncio.sleep(1)
+
+async def transmit_command(websocket, command_text):
+    """Send a command to Minecraft right away."""
     request_id = str(uuid.uuid4())
     
     # Build the command message
@@ -164,21 +695,133 @@ async def send_command(websocket, command_text):
     }
     
     try:
-        await websocket.send(json.dumps(message))
+        with timings.measure("io:send_command"):
+            await websocket.send(json.dumps(message))
         minecraft_data["stats"]["commands_sent"] += 1
-        log_message(f"📤 Sent command: {command_text}")
+        log_message(f"📤 Sent command: {command_text}", event="CommandSent")
         return True
     except Exception as e:
-        log_message(f"❌ Error sending command: {e}")
+        log_message(f"❌ Error sending command: {e}", level="ERROR")
         return False
 
-async def subscribe_event(websocket, event_name):
-    """Subscribe to a specific Minecraft event."""
+# Outbound pacing: admin is the web interface queue, bulk is build traffic
+ADMIN_INTERVAL = 0.1
+BULK_INTERVAL = 0.01
+BULK_QUEUE_LIMIT = 100
+INTERACTIVE_LATENCY_TARGET = float(os.environ.get("INTERACTIVE_LATENCY_MS", "250")) / 1000
+
+class OutboundScheduler:
+    """Sends the commands for one connection in priority order.
+
+    There are three lanes. Interactive commands (chat replies) are sent as
+    soon as the current send finishes. Admin commands are taken from the
+    shared command_queue and bulk commands (setblock for builds) wait behind
+    both. Admin and bulk sends are paced, but the pacing never holds up an
+    interactive command. Bulk producers block once BULK_QUEUE_LIMIT commands
+    are waiting, so a build cannot queue its whole structure at once.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.interactive = deque()
+        self.bulk = deque()
+        self._bulk_room = asyncio.Semaphore(BULK_QUEUE_LIMIT)
+        self._wake = asyncio.Event()
+        self._paced_until = 0
+        self._tasks = set()
+        self._runner = asyncio.create_task(self.run())
+
+    async def submit(self, command_text, lane="interactive"):
+        if lane == "bulk":
+            await self._bulk_room.acquire()
+            self.bulk.append((command_text, time.monotonic()))
+        elif lane == "admin":
+            command_queue.put(command_text)
+        else:
+            self.interactive.append((command_text, time.monotonic()))
+        self._wake.set()
+        return True
+
+    def wake(self):
+        """Tell the sender that command_queue may have new admin commands."""
+        self._wake.set()
+
+    def spawn(self, coro):
+        """Run a long job such as a build without blocking the connection's message loop."""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def _next(self, now):
+        """Pick the next (lane, command, queued_at), or a lane of None if nothing can go yet."""
+        if self.interactive:
+            return ("interactive",) + self.interactive.popleft()
+        if now < self._paced_until:
+            return None, None, None
+        if not command_queue.empty():
+            try:
+                return "admin", command_queue.get_nowait(), None
+            except queue.Empty:
+                pass
+        if self.bulk:
+            self._bulk_room.release()
+            return ("bulk",) + self.bulk.popleft()
+        return None, None, None
+
+    async def run(self):
+        while True:
+            now = time.monotonic()
+            lane, command_text, queued_at = self._next(now)
+            if lane is None:
+                self._wake.clear()
+                has_paced_work = self.bulk or not command_queue.empty()
+                timeout = max(self._paced_until - now, 0) if has_paced_work else None
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            if queued_at is not None:
+                waited = now - queued_at
+                timings.record(f"queue:{lane}", waited)
+                if lane == "interactive" and waited > INTERACTIVE_LATENCY_TARGET:
+                    log_message(f"Interactive command waited {waited * 1000:.0f} ms: {command_text}", level="WARNING", event="LatencyTarget")
+            
+            await transmit_command(self.websocket, command_text)
+            if lane == "admin":
+                self._paced_until = time.monotonic() + ADMIN_INTERVAL
+            elif lane == "bulk":
+                self._paced_until = time.monotonic() + BULK_INTERVAL
+
+    async def wait_bulk_sent(self):
+        """Wait until every queued bulk command has been sent."""
+        while self.bulk:
+            await asyncio.sleep(0.1)
+
+    def close(self):
+        self._runner.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+
+# Scheduler per connected websocket
+outbound = {}
+
+async def send_command(websocket, command_text, lane="interactive"):
+    """Queue a command to Minecraft in the given lane (interactive, admin or bulk)."""
+    scheduler = outbound.get(websocket)
+    if scheduler is None:
+        return await transmit_command(websocket, command_text)
+    return await scheduler.submit(command_text, lane)
+
+async def subscribe_event(websocket, event_name, purpose="subscribe"):
+    """Subscribe to (or with purpose="unsubscribe", drop) a specific Minecraft event."""
     await websocket.send(json.dumps({
         "header": {
             "version": 1,
             "requestId": str(uuid.uuid4()),
-            "messagePurpose": "subscribe",
+            "messagePurpose": purpose,
             "messageType": "commandRequest"
         },
         "body": {
@@ -186,71 +829,34 @@ async def subscribe_event(websocket, event_name):
         }
     }))
 
-def extract_player_name(body):
-    """Extract player name from various possible locations in the event body."""
-    player_data = body.get("player")
-    
-    if isinstance(player_data, dict):
-        player_name = player_data.get("name") or player_data.get("PlayerName")
-    else:
-        player_name = player_data
-    
-    if not player_name:
-        player_name = body.get("sender")
-    if not player_name:
-        properties = body.get("properties", {})
-        if isinstance(properties, dict):
-            player_name = properties.get("PlayerName")
-    
-    if player_name:
-        player_name = str(player_name)
-    
-    return player_name
+async def subscribe_events(websocket, event_names, purpose="subscribe"):
+    """Send a batch of subscription requests without waiting for each one to be answered."""
+    await asyncio.gather(*(subscribe_event(websocket, name, purpose) for name in event_names))
+
+async def update_subscriptions(subscribe=(), unsubscribe=()):
+    """Change the active events at runtime and apply it to every connection.
 
-def extract_position(data, pos_key="position"):
-    """Extract position information from data."""
-    pos = data.get(pos_key, {})
+    Returns the (added, removed) event names; unknown events and required
+    ones in unsubscribe are ignored.
+    """
+    added = sorted(name for name in subscribe if name in MINECRAFT_EVENTS and name not in active_events)
+    removed = sorted(name for name in unsubscribe if name in active_events and name not in REQUIRED_EVENTS)
+    active_events.update(added)
+    active_events.difference_update(removed)
     
-    if isinstance(pos, dict):
-        x = pos.get("x")
-        y = pos.get("y") 
-        z = pos.get("z")
-        
+    for websocket in list(outbound):
         try:
-            x = round(float(x), 2) if x is not None else None
-            y = round(float(y), 2) if y is not None else None
-            z = round(float(z), 2) if z is not None else None
-        except:
+            if added:
+                await subscribe_events(websocket, added)
+            if removed:
+                await subscribe_events(websocket, removed, "unsubscribe")
+        except websockets.exceptions.ConnectionClosed:
             pass
-            
-        return x, y, z
-    elif isinstance(pos, list) and len(pos) >= 3:
-        return pos[0], pos[1], pos[2]
-    
-    return None, None, None
-
-def extract_block_info(body):
-    """Extract block information from event body."""
-    block_data = body.get("block")
-    
-    if isinstance(block_data, dict):
-        block_name = (
-            block_data.get("id") or 
-            block_data.get("name") or 
-            block_data.get("type")
-        )
-    elif isinstance(block_data, str):
-        block_name = block_data
-    else:
-        block_name = body.get("blockType") or body.get("blockName") or "unknown_block"
-    
-    # Get player position
-    player_x, player_y, player_z = None, None, None
-    player_data = body.get("player", {})
-    if isinstance(player_data, dict):
-        player_x, player_y, player_z = extract_position(player_data, "position")
-    
-    return block_name, player_x, player_y, player_z
+    if added or removed:
+        changes = [f"+{name}" for name in added] + [f"-{name}" for name in removed]
+        log_message(f"Subscriptions changed: {' '.join(changes)}")
+        save_session_summary()
+    return added, removed
 
 async def build_structure(websocket, structure_name, player_name, base_x, base_y, base_z):
     """Build a structure at the specified location."""
@@ -283,18 +889,57 @@ async def build_structure(websocket, structure_name, player_name, base_x, base_y
         y = int(base_y + dy)
         z = int(base_z + dz)
         
-        await send_command(websocket, f"setblock {x} {y} {z} {block_type}")
+        # The bulk lane paces placements and keeps chat replies ahead of them
+        await send_command(websocket, f"setblock {x} {y} {z} {block_type}", lane="bulk")
         blocks_placed += 1
-        
-        # Small delay to prevent overwhelming the server
-        if blocks_placed % 10 == 0:
-            await asyncio.sleep(0.1)
     
+    if websocket in outbound:
+        await outbound[websocket].wait_bulk_sent()
     minecraft_data["stats"]["structures_built"] += 1
     await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§aBuilt {structure.get("name", structure_name)} ({blocks_placed} blocks)"}}]}}')
     log_message(f"Built {structure_name} for {player_name} at ({base_x}, {base_y}, {base_z})")
     return True
 
+async def run_region_actions(websocket, region, actions, trigger, player_name, position, received_ms, client_ip):
+    """Run the on_enter/on_leave actions of a region.
+
+    An action is a dict with one of "tellraw" (text shown to the player),
+    "command" or "log". Text may use {player}, {region}, {x}, {y} and {z}.
+    A log action writes a log line and records a RegionEnter/RegionLeave
+    event in the data file.
+    """
+    values = {"player": player_name, "region": region.title, **position}
+    for action in actions:
+        try:
+            if "tellraw" in action:
+                target = action.get("target", "{player}").format(**values)
+                text = json.dumps(action["tellraw"].format(**values), ensure_ascii=False)
+                await send_command(websocket, f'tellraw {target} {{"rawtext":[{{"text":{text}}}]}}')
+            elif "command" in action:
+                await send_command(websocket, action["command"].format(**values))
+            elif "log" in action:
+                event_name = "RegionEnter" if trigger == "enter" else "RegionLeave"
+                body = {"player": {"name": player_name, "position": dict(position)}, "region": region.name}
+                record_event(CapturedEvent(received_ms, event_name, normalize_event(event_name, body), body, client_ip))
+                log_message(action["log"].format(**values), event=event_name, player=player_name, region=region.name)
+        except (KeyError, ValueError, IndexError) as e:
+            log_message(f"Bad action in region {region.name}: {action} ({e})", level="WARNING")
+
+async def check_regions(websocket, player_name, position, received_ms, client_ip):
+    """Fire region triggers for a player's new position; only regions near the player are tested."""
+    with timings.measure("regions:update"):
+        entered, left = region_watcher.index.update(player_name, position["x"], position["y"], position["z"])
+    for region in left:
+        await run_region_actions(websocket, region, region.on_leave, "leave", player_name, position, received_ms, client_ip)
+    for region in entered:
+        await run_region_actions(websocket, region, region.on_enter, "enter", player_name, position, received_ms, client_ip)
+
+# Chat commands handled below; timings for anything else share one bucket
+CHAT_COMMANDS = {
+    "!help", "!stats", "!time", "!weather", "!gamemode", "!structures", "!top",
+    "!events", "!subscribe", "!unsubscribe", "!profile", "!build",
+}
+
 async def process_chat_command(websocket, player_name, message):
     """Process chat commands starting with !"""
     parts = message.split()
@@ -308,7 +953,11 @@ async def process_chat_command(websocket, player_name, message):
         help_text += "§7!weather <clear/rain/thunder> - Change weather\\n"
         help_text += "§7!gamemode <mode> - Change game mode\\n"
         help_text += "§7!build <structure> - Build a structure\\n"
-        help_text += "§7!structures - List available structures"
+        help_text += "§7!structures - List available structures\\n"
+        help_text += "§7!profile [seconds] - Profile the server (operators)\\n"
+        help_text += "§7!top <blocks/distance/messages> - Show the leaderboard\\n"
+        help_text += "§7!events - List subscribed events\\n"
+        help_text += "§7!subscribe/!unsubscribe <event> - Change subscriptions (operators)"
         await send_command(websocket, f'tellraw @a {{"rawtext":[{{"text":"{help_text}"}}]}}')
     
     elif command == "!stats":
@@ -350,6 +999,49 @@ async def process_chat_command(websocket, player_name, message):
         else:
             await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§cNo structures loaded!"}}]}}')
     
+    elif command == "!top":
+        metric = parts[1].lower() if len(parts) > 1 else ""
+        if metric not in leaderboards.METRICS:
+            await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§cUsage: !top blocks/distance/messages"}}]}}')
+        else:
+            lines = [f"§eTop {metric}:"]
+            for rank, (name, score) in enumerate(leaderboards.top(metric, 5), 1):
+                value = f"{score:.0f} blocks" if metric == "distance" else score
+                lines.append(f"§7{rank}. {name} - {value}")
+            if len(lines) == 1:
+                lines.append("§7Nobody yet")
+            top_text = "\\n".join(lines)
+            await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"{top_text}"}}]}}')
+    
+    elif command == "!events":
+        subscribed = ", ".join(sorted(active_events))
+        available = ", ".join(e for e in MINECRAFT_EVENTS if e not in active_events) or "none"
+        await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§eSubscribed: §7{subscribed}\\n§eAvailable: §7{available}"}}]}}')
+    
+    elif command in ("!subscribe", "!unsubscribe"):
+        if player_name not in OPERATORS:
+            await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§c{command} is only available to operators"}}]}}')
+        elif len(parts) > 1:
+            # Match event names case-insensitively since chat input is typed by hand
+            names = [e for e in MINECRAFT_EVENTS if e.lower() in {p.lower() for p in parts[1:]}]
+            if command == "!subscribe":
+                changed, _ = await update_subscriptions(subscribe=names)
+            else:
+                _, changed = await update_subscriptions(unsubscribe=names)
+            await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§e{command[1:].capitalize()}d: §7{", ".join(changed) or "nothing changed"}"}}]}}')
+        else:
+            await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§cUsage: {command} <event> [event...]"}}]}}')
+    
+    elif command == "!profile":
+        if player_name not in OPERATORS:
+            await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§c!profile is only available to operators"}}]}}')
+        else:
+            seconds = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 30
+            if start_profile(seconds, player_name):
+                await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§eProfiling for {min(seconds, MAX_PROFILE_SECONDS)}s, report goes to data/"}}]}}')
+            else:
+                await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§cA profile is already running"}}]}}')
+    
     elif command == "!build":
         if len(parts) > 1:
             structure_name = parts[1].lower()
@@ -359,8 +1051,13 @@ async def process_chat_command(websocket, player_name, message):
                 pos = player_positions[player_name]
                 x, y, z = pos['x'], pos['y'], pos['z']
                 
-                # Offset slightly so structure doesn't build on top of player
-                await build_structure(websocket, structure_name, player_name, x + 2, y, z + 2)
+                # Offset slightly so structure doesn't build on top of player.
+                # Builds run in the background so chat keeps being handled meanwhile.
+                build = build_structure(websocket, structure_name, player_name, x + 2, y, z + 2)
+                if websocket in outbound:
+                    outbound[websocket].spawn(build)
+                else:
+                    await build
             else:
                 await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§cCannot determine your position. Move around first!"}}]}}')
         else:
@@ -369,14 +1066,14 @@ async def process_chat_command(websocket, player_name, message):
 
 async def handler(websocket):
     """Handle WebSocket connections from Minecraft."""
-    client_ip = websocket.remote_address[0]
+    client_ip = sys.intern(websocket.remote_address[0])
     log_message(f"[+] Connection from {client_ip}")
+    scheduler = outbound[websocket] = OutboundScheduler(websocket)
     
-    # Subscribe to all events
-    for event in MINECRAFT_EVENTS:
-        await subscribe_event(websocket, event)
+    # Subscribe to the events of the active profile
+    await subscribe_events(websocket, sorted(active_events))
     
-    log_message(f"[{client_ip}] Subscribed to {len(MINECRAFT_EVENTS)} events")
+    log_message(f"[{client_ip}] Subscribed to {len(active_events)} events ({EVENT_PROFILE})")
     
     # Send welcome message
     await send_command(websocket, 'tellraw @a {"rawtext":[{"text":"§e§lWebSocket Server Connected!\\n§7Commands enabled. Type !help for info."}]}')
@@ -385,21 +1082,13 @@ async def handler(websocket):
     async def command_checker():
         while True:
             try:
-                # Check file for pending commands
-                num_commands = check_pending_commands()
-                
-                # Process commands from queue
-                while not command_queue.empty():
-                    try:
-                        cmd = command_queue.get_nowait()
-                        await send_command(websocket, cmd)
-                        await asyncio.sleep(0.1)  # Small delay between commands
-                    except queue.Empty:
-                        break
+                # Check file for pending commands; the scheduler sends them in the admin lane
+                if check_pending_commands():
+                    scheduler.wake()
                 
                 await asyncio.sleep(1)  # Check every second
             except Exception as e:
-                log_message(f"Command checker error: {e}")
+                log_message(f"Command checker error: {e}", level="ERROR")
                 break
     
     # Start command checker task
@@ -407,10 +1096,13 @@ async def handler(websocket):
     
     try:
         async for message in websocket:
+            started = time.perf_counter()
             try:
                 data = json.loads(message)
             except json.JSONDecodeError:
                 continue
+            finally:
+                timings.record("io:json_loads", time.perf_counter() - started)
             
             header = data.get("header", {})
             body = data.get("body", {})
@@ -427,30 +1119,30 @@ async def handler(websocket):
                     minecraft_data["stats"]["commands_successful"] += 1
                     # Don't log every successful block placement
                     if "setblock" not in status_message.lower():
-                        log_message(f"✅ Command successful: {status_message}")
+                        log_message(f"✅ Command successful: {status_message}", event="CommandResponse")
                 else:
-                    log_message(f"❌ Command failed (code {status_code}): {status_message}")
+                    log_message(f"❌ Command failed (code {status_code}): {status_message}", level="WARNING", status_code=status_code)
                 continue
             
             # Process events
             if message_purpose == "event" and event_name:
-                player_name = extract_player_name(body)
+                # The only clock read for this event; everything below reuses it
+                received_ms = time.time_ns() // 1_000_000
                 
-                event_entry = {
-                    "timestamp": datetime.now().isoformat(),
-                    "event": event_name,
-                    "player": player_name,
-                    "data": body,
-                    "client_ip": client_ip
-                }
+                # Extract player, position and block once; analysis reads this back
+                normalized = normalize_event(event_name, body)
+                player_name = normalized.get("player")
+                position = {"x": normalized["x"], "y": normalized["y"], "z": normalized["z"]} if "x" in normalized else None
                 
-                minecraft_data["events"].append(event_entry)
-                minecraft_data["stats"]["total_events"] += 1
+                event_entry = CapturedEvent(received_ms, event_name, normalized, body, client_ip)
+                player_name = event_entry.player
+                
+                record_event(event_entry)
                 
                 # Update player data
                 if player_name and player_name not in minecraft_data["players"]:
                     minecraft_data["players"][player_name] = {
-                        "first_seen": datetime.now().isoformat(),
+                        "first_seen": received_ms,
                         "event_count": 0,
                         "messages": 0,
                         "blocks_placed": 0,
@@ -460,77 +1152,85 @@ async def handler(websocket):
                 
                 if player_name and player_name in minecraft_data["players"]:
                     minecraft_data["players"][player_name]["event_count"] += 1
-                    minecraft_data["players"][player_name]["last_seen"] = datetime.now().isoformat()
-                
-                timestamp_str = datetime.now().strftime("%H:%M:%S")
+                    minecraft_data["players"][player_name]["last_seen"] = received_ms
                 
                 # Track player position
                 if event_name in ["PlayerTransform", "PlayerTravelled"]:
-                    player_data = body.get("player", {})
-                    if isinstance(player_data, dict):
-                        x, y, z = extract_position(player_data, "position")
-                        if x is not None and player_name:
-                            player_positions[player_name] = {"x": x, "y": y, "z": z}
-                            minecraft_data["players"][player_name]["last_position"] = {"x": x, "y": y, "z": z}
+                    if position and player_name:
+                        track_position(player_name, position)
                 
                 elif event_name == "PlayerMessage":
                     message_text = body.get("message", "")
                     minecraft_data["stats"]["messages"] += 1
                     if player_name:
                         minecraft_data["players"][player_name]["messages"] += 1
-                    log_message(f"[{timestamp_str}] 💬 CHAT: {player_name}: {message_text}")
+                        leaderboards.add("messages", player_name)
+                    log_message(f"[{clock_time(received_ms)}] 💬 CHAT: {player_name}: {message_text}", event=event_name, player=player_name)
                     
                     # Process chat commands
                     if message_text.startswith("!"):
-                        await process_chat_command(websocket, player_name, message_text)
+                        command = message_text.split()[0].lower()
+                        if command not in CHAT_COMMANDS:
+                            command = "unknown"
+                        with timings.measure(f"command:{command}"):
+                            await process_chat_command(websocket, player_name, message_text)
                 
                 elif event_name == "BlockPlaced":
-                    block_name, player_x, player_y, player_z = extract_block_info(body)
+                    block_name = normalized.get("block", "unknown_block")
                     minecraft_data["stats"]["blocks_placed"] += 1
                     if player_name:
                         minecraft_data["players"][player_name]["blocks_placed"] += 1
-                        if player_x is not None:
-                            player_positions[player_name] = {"x": player_x, "y": player_y, "z": player_z}
-                            minecraft_data["players"][player_name]["last_position"] = {"x": player_x, "y": player_y, "z": player_z}
+                        leaderboards.add("blocks", player_name)
+                        if position:
+                            track_position(player_name, position)
                     
-                    log_message(f"[{timestamp_str}] 🔨 PLACED: {player_name} placed {block_name} at ({player_x}, {player_y}, {player_z})")
+                    log_message(f"[{clock_time(received_ms)}] 🔨 PLACED: {player_name} placed {block_name} at ({normalized.get('x')}, {normalized.get('y')}, {normalized.get('z')})", event=event_name, player=player_name, block=block_name)
                 
                 elif event_name == "BlockBroken":
-                    block_name, player_x, player_y, player_z = extract_block_info(body)
+                    block_name = normalized.get("block", "unknown_block")
                     minecraft_data["stats"]["blocks_broken"] += 1
                     if player_name:
                         minecraft_data["players"][player_name]["blocks_broken"] += 1
-                        if player_x is not None:
-                            player_positions[player_name] = {"x": player_x, "y": player_y, "z": player_z}
-                            minecraft_data["players"][player_name]["last_position"] = {"x": player_x, "y": player_y, "z": player_z}
+                        leaderboards.add("blocks", player_name)
+                        if position:
+                            track_position(player_name, position)
                     
-                    log_message(f"[{timestamp_str}] ⛏️  BROKEN: {player_name} broke {block_name} at ({player_x}, {player_y}, {player_z})")
+                    log_message(f"[{clock_time(received_ms)}] ⛏️  BROKEN: {player_name} broke {block_name} at ({normalized.get('x')}, {normalized.get('y')}, {normalized.get('z')})", event=event_name, player=player_name, block=block_name)
                 
                 elif event_name == "PlayerJoin":
-                    log_message(f"[{timestamp_str}] ✅ JOIN: {player_name} joined")
+                    log_message(f"[{clock_time(received_ms)}] ✅ JOIN: {player_name} joined", event=event_name, player=player_name)
                     await send_command(websocket, f'tellraw {player_name} {{"rawtext":[{{"text":"§aWelcome! Type !help for commands."}}]}}')
                 
                 elif event_name == "PlayerLeave":
-                    log_message(f"[{timestamp_str}] ❌ LEAVE: {player_name} left")
+                    log_message(f"[{clock_time(received_ms)}] ❌ LEAVE: {player_name} left", event=event_name, player=player_name)
                     if player_name in player_positions:
                         del player_positions[player_name]
+                    region_watcher.index.forget(player_name)
                 
                 elif event_name not in ["PlayerTransform", "PlayerTravelled"]:
-                    log_message(f"[{timestamp_str}] 📌 EVENT: {event_name} by {player_name or 'System'}")
+                    log_message(f"[{clock_time(received_ms)}] 📌 EVENT: {event_name} by {player_name or 'System'}", event=event_name, player=player_name)
                 
-                # Save data periodically
-                if minecraft_data["stats"]["total_events"] % 10 == 0:
+                # Region triggers run on every position update
+                if position and player_name and event_name in POSITION_EVENTS:
+                    await check_regions(websocket, player_name, position, received_ms, client_ip)
+                
+                # Save data periodically; region events count too
+                if unsaved_events >= 10:
                     save_data()
-                    log_message(f"[{timestamp_str}] 💾 Data saved ({minecraft_data['stats']['total_events']} events)")
+                    log_message(f"[{clock_time(received_ms)}] 💾 Data saved ({minecraft_data['stats']['total_events']} events)", level="DEBUG")
+                
+                timings.record(f"event:{event_name}", time.perf_counter() - started)
     
     except websockets.exceptions.ConnectionClosed:
         log_message(f"[-] Connection closed from {client_ip}")
     except Exception as e:
-        log_message(f"[ERROR] {e}")
+        log_message(f"[ERROR] {e}", level="ERROR")
         import traceback
         traceback.print_exc()
     finally:
         command_task.cancel()
+        scheduler.close()
+        outbound.pop(websocket, None)
         log_message(f"[-] Disconnection from {client_ip}")
         save_data()
         log_message(f"Data saved to: {DATA_FILE}")
@@ -548,6 +1248,8 @@ async def main():
     print(f"Data file: {DATA_FILE}", flush=True)
     print(f"Command file: {COMMAND_FILE}", flush=True)
     print(f"Structures file: {STRUCTURES_FILE}", flush=True)
+    print(f"Regions file: {REGIONS_FILE} ({len(region_watcher.index.regions)} regions)", flush=True)
+    print(f"Event profile: {EVENT_PROFILE} ({len(active_events)} events)", flush=True)
     print("=" * 60, flush=True)
     print(f"To connect: /connect {local_ip}:{port}", flush=True)
     print("=" * 60, flush=True)
@@ -559,20 +1261,33 @@ async def main():
     print("  !gamemode   - Change game mode", flush=True)
     print("  !build      - Build a structure at your location", flush=True)
     print("  !structures - List available structures", flush=True)
+    print("  !profile    - Profile the server for N seconds (OPERATORS only)", flush=True)
+    print("  !top        - Leaderboards (blocks/distance/messages)", flush=True)
+    print("  !events     - List subscribed events", flush=True)
+    print("  !subscribe / !unsubscribe <event> - Change subscriptions (OPERATORS only)", flush=True)
     print("\nWeb interface can also send commands!", flush=True)
     print("=" * 60, flush=True)
     
-    # Initialize command file
+    # Initialize command and control files
     with open(COMMAND_FILE, 'w', encoding='utf-8') as f:
         json.dump([], f)
+    with open(CONTROL_FILE, 'w', encoding='utf-8') as f:
+        json.dump([], f)
     
     save_data()
     
     try:
-        server = await websockets.serve(handler, local_ip, port)
+        try:
+            server = await websockets.serve(handler, local_ip, port)
+        except OSError as e:
+            # The web interface reports this line as the cause of the failure
+            print(f"[FAILED] Could not listen on {local_ip}:{port}: {e}", flush=True)
+            sys.exit(1)
         print("\n[OK] Server is running!", flush=True)
+        # The web interface waits for this line before reporting a successful start
+        print(f"[READY] Listening on {local_ip}:{port}", flush=True)
         
-        await asyncio.Future()
+        await control_checker()
     except KeyboardInterrupt:
         print("\n[STOP] Shutting down...", flush=True)
         save_data()
@@ -0,0 +1,167 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Events whose body describes a block
+BLOCK_EVENTS = ("BlockPlaced", "BlockBroken")
+
+def extract_player_name(body):
+    """Extract player name from various possible locations in the event body."""
+    player_data = body.get("player")
+    
+    if isinstance(player_data, dict):
+        player_name = player_data.get("name") or player_data.get("PlayerName")
+    else:
+        player_name = player_data
+    
+    if not player_name:
+        player_name = body.get("sender")
+    if not player_name:
+        properties = body.get("properties", {})
+        if isinstance(properties, dict):
+            player_name = properties.get("PlayerName")
+    
+    if player_name:
+        player_name = str(player_name)
+    
+    return player_name
+
+def extract_position(data, pos_key="position"):
+    """Extract position information from data."""
+    pos = data.get(pos_key, {})
+    
+    if isinstance(pos, dict):
+        x = pos.get("x")
+        y = pos.get("y") 
+        z = pos.get("z")
+        
+        try:
+            x = round(float(x), 2) if x is not None else None
+            y = round(float(y), 2) if y is not None else None
+            z = round(float(z), 2) if z is not None else None
+        except:
+            pass
+            
+        return x, y, z
+    elif isinstance(pos, list) and len(pos) >= 3:
+        return pos[0], pos[1], pos[2]
+    
+    return None, None, None
+
+def extract_block_info(body):
+    """Extract block information from event body."""
+    block_data = body.get("block")
+    
+    if isinstance(block_data, dict):
+        block_name = (
+            block_data.get("id") or 
+            block_data.get("name") or 
+            block_data.get("type")
+        )
+    elif isinstance(block_data, str):
+        block_name = block_data
+    else:
+        block_name = body.get("blockType") or body.get("blockName") or "unknown_block"
+    
+    # Get player position
+    player_x, player_y, player_z = None, None, None
+    player_data = body.get("player", {})
+    if isinstance(player_data, dict):
+        player_x, player_y, player_z = extract_position(player_data, "position")
+    
+    return block_name, player_x, player_y, player_z
+
+def extract_item_name(body):
+    """Extract the item name from an item event body."""
+    item_data = body.get("item")
+    if isinstance(item_data, dict):
+        return item_data.get("id") or item_data.get("name") or item_data.get("type")
+    if isinstance(item_data, str):
+        return item_data
+    return None
+
+def _to_float(value):
+    try:
+        return round(float(value), 2)
+    except (TypeError, ValueError):
+        return None
+
+def normalize_event(event_name, body, player_name=None):
+    """Build the compact record stored with each event.
+
+    Holds the player, their position and the block or item involved, with
+    keys left out when unknown. This is the single definition of those fields
+    for both the capture server and the analysis tools.
+    """
+    record = {}
+    if not isinstance(body, dict):
+        return record
+
+    player_name = player_name or extract_player_name(body)
+    if player_name:
+        record["player"] = player_name
+
+    x, y, z = None, None, None
+    player_data = body.get("player")
+    if isinstance(player_data, dict) and "position" in player_data:
+        x, y, z = extract_position(player_data, "position")
+    elif body.get("position"):
+        x, y, z = extract_position(body, "position")
+    x, y, z = _to_float(x), _to_float(y), _to_float(z)
+    if x is not None and y is not None and z is not None:
+        record["x"], record["y"], record["z"] = x, y, z
+
+    if event_name in BLOCK_EVENTS or "block" in body:
+        block_name = extract_block_info(body)[0]
+        if block_name:
+            record["block"] = str(block_name)
+
+    item_name = extract_item_name(body)
+    if item_name:
+        record["item"] = str(item_name)
+
+    return record
+
+def event_record(event):
+    """Get an event's normalized record, computing it for files captured before records were stored."""
+    record = event.get("normalized")
+    if record is None:
+        record = normalize_event(event.get("event") or event.get("type"), event.get("data") or {}, event.get("player"))
+    return record
+
+def upgrade_file(path):
+    """Add normalized records to every event of a session file that lacks one.
+
+    Returns the number of events upgraded; the file is only rewritten when
+    that is more than zero.
+    """
+    path = Path(path)
+    with path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    upgraded = 0
+    for event in data.get("events", []):
+        if "normalized" not in event:
+            event["normalized"] = event_record(event)
+            upgraded += 1
+
+    if upgraded:
+        tmp_file = path.with_suffix(".upgrading")
+        with tmp_file.open("w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        tmp_file.replace(path)
+    return upgraded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add normalized event records to captured session files")
+    parser.add_argument("files", nargs="+", help="MinecraftData_*.json files to upgrade")
+    args = parser.parse_args()
+
+    for path in args.files:
+        try:
+            count = upgrade_file(path)
+            print(f"{path}: {count} events upgraded" if count else f"{path}: already up to date")
+        except Exception as e:
+            print(f"Error upgrading {path}: {e}", file=sys.stderr)
@@ -0,0 +1,122 @@
+import json
+import math
+import os
+
+
+class Region:
+    """A named box or sphere with the actions to run when players enter or leave it."""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.title = config.get("name", name)
+        if "center" in config:
+            center = config["center"]
+            self.center = (float(center["x"]), float(center.get("y", 0)), float(center["z"]))
+            self.radius = float(config["radius"])
+            # A sphere without a y in its center is a cylinder covering all heights
+            self.vertical = "y" in center
+            cx, cy, cz = self.center
+            r = self.radius
+            self.min = (cx - r, cy - r if self.vertical else -math.inf, cz - r)
+            self.max = (cx + r, cy + r if self.vertical else math.inf, cz + r)
+        else:
+            low, high = config["min"], config["max"]
+            self.center = None
+            self.min = (float(low["x"]), float(low.get("y", -math.inf)), float(low["z"]))
+            self.max = (float(high["x"]), float(high.get("y", math.inf)), float(high["z"]))
+        self.on_enter = config.get("on_enter", [])
+        self.on_leave = config.get("on_leave", [])
+
+    def contains(self, x, y, z):
+        if self.center is None:
+            return (self.min[0] <= x <= self.max[0] and self.min[1] <= y <= self.max[1]
+                    and self.min[2] <= z <= self.max[2])
+        cx, cy, cz = self.center
+        dy = y - cy if self.vertical else 0
+        return (x - cx) ** 2 + dy ** 2 + (z - cz) ** 2 <= self.radius ** 2
+
+
+class RegionIndex:
+    """Regions bucketed on a uniform X/Z grid.
+
+    Each region is listed in every cell its bounding box overlaps, so a
+    position update only tests the regions of the cell the player is in.
+    Tracks which regions each player is inside to report enters and leaves.
+    """
+
+    def __init__(self, regions, cell_size=16):
+        self.regions = regions
+        self.cell_size = cell_size
+        self.cells = {}
+        self.inside = {}
+        for region in regions:
+            x0, z0 = self._cell(region.min[0], region.min[2])
+            x1, z1 = self._cell(region.max[0], region.max[2])
+            for cx in range(x0, x1 + 1):
+                for cz in range(z0, z1 + 1):
+                    self.cells.setdefault((cx, cz), []).append(region)
+
+    def _cell(self, x, z):
+        return int(x // self.cell_size), int(z // self.cell_size)
+
+    def update(self, player, x, y, z):
+        """Record a player's new position and return the (entered, left) regions."""
+        current = {
+            region.name: region
+            for region in self.cells.get(self._cell(x, z), ())
+            if region.contains(x, y, z)
+        }
+        previous = self.inside.get(player, {})
+        if not current and not previous:
+            return [], []
+        self.inside[player] = current
+        entered = [region for name, region in current.items() if name not in previous]
+        left = [region for name, region in previous.items() if name not in current]
+        return entered, left
+
+    def forget(self, player):
+        """Drop a player's state, e.g. when they leave the game."""
+        self.inside.pop(player, None)
+
+    def adopt_state(self, other):
+        """Carry over which players are inside regions that still exist after a reload."""
+        names = {region.name: region for region in self.regions}
+        for player, regions in other.inside.items():
+            kept = {name: names[name] for name in regions if name in names}
+            if kept:
+                self.inside[player] = kept
+
+
+def load_regions(path):
+    """Build a RegionIndex from a regions file; regions with "enabled": false are skipped."""
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    regions = [
+        Region(name, region)
+        for name, region in config.get("regions", {}).items()
+        if region.get("enabled", True)
+    ]
+    return RegionIndex(regions, config.get("cell_size", 16))
+
+
+class RegionWatcher:
+    """Reloads the regions file when its modification time changes."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.index = RegionIndex([])
+
+    def check(self):
+        """Reload if the file changed. Returns the number of regions loaded, or None if nothing changed."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self.mtime:
+            return None
+        self.mtime = mtime
+        index = load_regions(self.path) if mtime is not None else RegionIndex([])
+        index.adopt_state(self.index)
+        self.index = index
+        return len(index.regions)
@@ -0,0 +1,253 @@
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from minecraft_events import event_record
+
+# pyarrow is only needed for Parquet export
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+READ_SIZE = 1 << 20
+COLUMNS = ["timestamp", "event", "player", "x", "y", "z", "block", "message"]
+BATCH_SIZE = 10000
+
+if pa is not None:
+    PARQUET_SCHEMA = pa.schema([
+        ("timestamp", pa.timestamp("ms")),
+        ("event", pa.dictionary(pa.int32(), pa.string())),
+        ("player", pa.dictionary(pa.int32(), pa.string())),
+        ("x", pa.float64()),
+        ("y", pa.float64()),
+        ("z", pa.float64()),
+        ("block", pa.dictionary(pa.int32(), pa.string())),
+        ("message", pa.string()),
+    ])
+
+
+def flatten_event(event):
+    """Flatten a captured event into a (timestamp, event, player, x, y, z, block, message) row."""
+    body = event.get("data") or {}
+    if not isinstance(body, dict):
+        body = {}
+    record = event_record(event)
+
+    timestamp = None
+    if event.get("timestamp"):
+        try:
+            timestamp = datetime.fromisoformat(event["timestamp"])
+        except (TypeError, ValueError):
+            pass
+
+    message = body.get("message")
+    return (
+        timestamp,
+        event.get("event") or event.get("type"),
+        record.get("player"),
+        record.get("x"), record.get("y"), record.get("z"),
+        record.get("block"),
+        message if isinstance(message, str) else None,
+    )
+
+
+class _JsonStream:
+    """Decodes the JSON values of a file one at a time, reading it in chunks."""
+
+    def __init__(self, f, read_size):
+        self.f = f
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+
+    def _more(self):
+        chunk = self.f.read(self.read_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._more():
+                raise ValueError("Session file ends unexpectedly")
+
+    def skip(self, char):
+        """Consume char if it is next; returns whether it was."""
+        if self.peek() != char:
+            return False
+        self.pos += 1
+        return True
+
+    def expect(self, char):
+        if not self.skip(char):
+            raise ValueError(f"Expected {char!r} in session file")
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                # The value runs past the end of the buffer; read on
+                if not self._more():
+                    raise
+                continue
+            # A number at the very end may continue in the next chunk
+            if end == len(self.buffer) and self._more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_events(path, read_size=READ_SIZE, fields=None):
+    """Yield the events of a session file one at a time.
+
+    Reads the file in read_size chunks and decodes the "events" array
+    element by element, so only one chunk and one event are held at once.
+    The other top-level values (server_start, players, stats) are stored in
+    the fields dict if one is given, once the generator has got past them.
+    Raises ValueError if the file is not a complete session.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f, read_size)
+        stream.expect("{")
+        found = False
+        while not stream.skip("}"):
+            key = stream.value()
+            stream.expect(":")
+            if key == "events":
+                found = True
+                stream.expect("[")
+                while not stream.skip("]"):
+                    yield stream.value()
+                    stream.skip(",")
+            else:
+                value = stream.value()
+                if fields is not None:
+                    fields[key] = value
+            stream.skip(",")
+        if not found:
+            raise ValueError("No events array found")
+
+
+def iter_row_batches(events, batch_size=BATCH_SIZE):
+    """Yield lists of flattened rows, batch_size events at a time."""
+    batch = []
+    for event in events:
+        batch.append(flatten_event(event))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def rows_to_record_batch(rows):
+    """Turn a list of rows into a typed Arrow record batch."""
+    columns = list(zip(*rows)) if rows else [[] for _ in COLUMNS]
+    arrays = [
+        pa.array(column, type=field.type) if not pa.types.is_dictionary(field.type)
+        else pa.array(column, type=pa.string()).dictionary_encode().cast(field.type)
+        for column, field in zip(columns, PARQUET_SCHEMA)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=PARQUET_SCHEMA)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back out in chunks."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(events, batch_size=BATCH_SIZE, compression="zstd"):
+    """Yield a Parquet file as bytes, one row group per batch of events."""
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, PARQUET_SCHEMA, compression=compression) as writer:
+        for rows in iter_row_batches(events, batch_size):
+            writer.write_batch(rows_to_record_batch(rows))
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def iter_csv(events, batch_size=BATCH_SIZE):
+    """Yield CSV text encoded as UTF-8, one chunk per batch of events."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for rows in iter_row_batches(events, batch_size):
+        for row in rows:
+            timestamp = row[0].isoformat() if row[0] else ""
+            writer.writerow((timestamp,) + row[1:])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    data = buffer.getvalue()
+    if data:
+        yield data.encode("utf-8")
+
+
+EXPORTERS = {
+    "parquet": (iter_parquet, ".parquet", "application/vnd.apache.parquet"),
+    "csv": (iter_csv, ".csv", "text/csv"),
+}
+
+
+def export_session(data_file, export_format="parquet", output_file=None):
+    """Export a captured session file and return the path written."""
+    exporter, extension, _ = EXPORTERS[export_format]
+    data_file = Path(data_file)
+    output_file = Path(output_file) if output_file else data_file.with_suffix(extension)
+    with output_file.open("wb") as f:
+        for chunk in exporter(iter_events(data_file)):
+            f.write(chunk)
+    return output_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export captured Minecraft sessions to Parquet or CSV")
+    parser.add_argument("files", nargs="+", help="MinecraftData_*.json files to export")
+    parser.add_argument("--format", choices=sorted(EXPORTERS), default="parquet")
+    args = parser.parse_args()
+
+    for path in args.files:
+        try:
+            print(f"Exported {path} -> {export_session(path, args.format)}")
+        except Exception as e:
+            print(f"Error exporting {path}: {e}", file=sys.stderr)